@@ -0,0 +1,10 @@
+"""
+Benchmarks for the vocabulary tooling.
+
+These are not run automatically.  Run them from the root of the repository,
+e.g., as
+
+  python3 -m benchmarks.startup
+
+Each module's docstring explains what it measures.
+"""
@@ -0,0 +1,84 @@
+"""
+Times convert.close_transitively on synthetic hierarchies.
+
+Trees are generated with a given number of nodes and branching factor,
+where the nodes are numbered breadth-first (so node i has the parent
+(i-1)//branching).  In addition, a single chain is timed to show that
+deep hierarchies do not run into the recursion limit; since the output
+of the closure of a chain grows quadratically with its length, that
+chain is shorter.
+"""
+
+import time
+
+import convert
+
+
+def make_tree(n_nodes, branching):
+    """returns a raw_narrower dictionary for a tree of n_nodes nodes.
+    """
+    raw_narrower = {}
+    for node in range(1, n_nodes):
+        raw_narrower.setdefault((node-1)//branching, []).append(node)
+    return raw_narrower
+
+
+def make_chain(length):
+    """returns a raw_narrower dictionary for a chain of length nodes.
+    """
+    return dict((node, [node+1]) for node in range(length-1))
+
+
+def time_closure(raw_narrower):
+    """returns a pair (seconds, total size of the closure) for closing
+    raw_narrower.
+    """
+    start = time.perf_counter()
+    convert.close_transitively(raw_narrower)
+    elapsed = time.perf_counter()-start
+    return elapsed, sum(len(l) for l in raw_narrower.values())
+
+
+def parse_command_line():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Times the transitive closure of wider on synthetic"
+            " trees.")
+    parser.add_argument("--sizes",
+        help="Tree sizes to time (default: %(default)s).",
+        type=int,
+        nargs="+",
+        default=[10**5, 3*10**5, 10**6])
+    parser.add_argument("--branching",
+        help="Branching factors to time (default: %(default)s).",
+        type=int,
+        nargs="+",
+        default=[2, 10, 100])
+    parser.add_argument("--chain-length",
+        help="Length of the chain to time (default: %(default)s).",
+        type=int,
+        default=5000)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_command_line()
+
+    for branching in args.branching:
+        for n_nodes in args.sizes:
+            elapsed, closure_size = time_closure(
+                make_tree(n_nodes, branching))
+            print("tree of {} nodes, branching {}: {:.2f} s,"
+                " {} closure entries, {:.0f} ns/entry".format(
+                    n_nodes, branching, elapsed, closure_size,
+                    elapsed/closure_size*1e9))
+
+    elapsed, closure_size = time_closure(make_chain(args.chain_length))
+    print("chain of {} nodes: {:.2f} s, {} closure entries".format(
+        args.chain_length, elapsed, closure_size))
+
+
+if __name__=="__main__":
+    main()
+
+# vi:sw=4:et:sta
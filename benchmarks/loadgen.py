@@ -0,0 +1,370 @@
+"""
+Generates load on a vocabulary repository and reports latencies.
+
+This sends requests for vocabulary and term URIs with a mix of Accept
+headers to a repository at a base URL (e.g., http://www.ivoa.net/rdf/,
+or a local stand-in such as serve-rdf.py at http://localhost:8080/rdf/)
+over a number of concurrent keep-alive connections.  The vocabularies
+are drawn with the weights given with --vocab; the defaults mimic the
+traffic we see, where uat and datalink/core get most requests.  Term
+URIs only differ from vocabulary URIs in the fragment, which clients do
+not send, so each term resolution is a request for the vocabulary.
+
+Latencies are per resolution, i.e., the redirect from the vocabulary URI
+plus, with --follow, retrieving the document redirected to.  For each
+representation (i.e., requested media type), this reports the number
+of requests, the errors (failed requests and statuses other than the
+expected ones), the 50th, 95th, and 99th percentiles of the latencies,
+and the throughput.  With --json, the results are also written to a file
+so runs against different configurations can be compared.
+
+Only the python standard library is used; https works, too.
+"""
+
+import asyncio
+import json
+import random
+import ssl
+import sys
+import time
+from urllib import parse as urlparse
+
+
+# the default weights of vocabularies and media types requested
+DEFAULT_VOCABS = [
+    ("uat", 40),
+    ("datalink/core", 30),
+    ("product-type", 5),
+    ("messenger", 5),
+    ("refframe", 5),
+    ("timescale", 5),
+    ("object-type", 5),
+    ("processing-level", 5),
+]
+DEFAULT_ACCEPTS = [
+    ("text/html", 50),
+    ("application/rdf+xml", 15),
+    ("text/turtle", 10),
+    ("application/ld+json", 10),
+    ("application/x-desise+json", 15),
+]
+
+# status codes that are not errors for resolving and following
+RESOLVE_STATUSES = frozenset([200, 301, 302, 303, 307, 308])
+FOLLOW_STATUSES = frozenset([200, 304])
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection(object):
+    """A persistent HTTP/1.1 connection to a host.
+
+    This is a minimal client that reads bodies with Content-Length,
+    chunked transfer encoding, or up to the end of the connection.
+    Connections are re-opened when the server closes them.
+    """
+    def __init__(self, scheme, netloc):
+        self.scheme, self.netloc = scheme, netloc
+        parsed = urlparse.urlsplit("{}://{}".format(scheme, netloc))
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if scheme=="https" else 80)
+        self.reader = self.writer = None
+
+    async def _open(self):
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port,
+            ssl=ssl.create_default_context() if self.scheme=="https"
+                else None)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def _read_body(self, headers):
+        if headers.get("transfer-encoding", "").lower()=="chunked":
+            parts = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size==0:
+                    # skip trailers
+                    while (await self.reader.readline()).strip():
+                        pass
+                    return b"".join(parts)
+                parts.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+
+        if "content-length" in headers:
+            return await self.reader.readexactly(
+                int(headers["content-length"]))
+
+        body = await self.reader.read()
+        self.close()
+        return body
+
+    async def request(self, path, headers, retry=True):
+        """returns (status, headers, body) for a GET of path.
+
+        headers is a dictionary of the request headers to send; the
+        response headers have lowercase names.
+        """
+        if self.writer is None:
+            await self._open()
+
+        lines = ["GET {} HTTP/1.1".format(path), "Host: "+self.netloc]
+        lines.extend("{}: {}".format(*h) for h in headers.items())
+        self.writer.write(("\r\n".join(lines)+"\r\n\r\n").encode("utf-8"))
+        try:
+            await self.writer.drain()
+            status_line = await self.reader.readline()
+            if not status_line:
+                raise ConnectionResetError("Server closed connection")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # the server may have closed an idle keep-alive connection
+            self.close()
+            if retry:
+                return await self.request(path, headers, retry=False)
+            raise
+
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise HTTPError("Bad status line {!r}".format(status_line))
+
+        response_headers = {}
+        while True:
+            ln = await self.reader.readline()
+            if not ln.strip():
+                break
+            name, _, value = ln.decode("iso-8859-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        body = b"" if status in (204, 304) else await self._read_body(
+            response_headers)
+        if response_headers.get("connection", "").lower()=="close":
+            self.close()
+        return status, response_headers, body
+
+
+def make_requests(n_requests, vocabs, accepts, seed):
+    """returns a list of n_requests (vocabulary path, media type) pairs
+    drawn with the weights in vocabs and accepts.
+
+    These are lists of (item, weight) pairs.
+    """
+    rng = random.Random(seed)
+    vocab_paths = rng.choices([v for v, _ in vocabs],
+        weights=[w for _, w in vocabs], k=n_requests)
+    media_types = rng.choices([a for a, _ in accepts],
+        weights=[w for _, w in accepts], k=n_requests)
+    return list(zip(vocab_paths, media_types))
+
+
+async def resolve(connections, base_url, vocab_path, media_type,
+        extra_headers, follow):
+    """resolves the vocabulary vocab_path below base_url for media_type
+    and returns a pair of an error message (None if all went well) and
+    the number of bytes received.
+
+    connections is a dictionary of Connections by (scheme, netloc),
+    which is added to as necessary.
+    """
+    url, n_bytes = urlparse.urljoin(base_url, vocab_path), 0
+    headers = dict(extra_headers, Accept=media_type)
+    expected = RESOLVE_STATUSES
+
+    for _ in range(2 if follow else 1):
+        parsed = urlparse.urlsplit(url)
+        key = (parsed.scheme, parsed.netloc)
+        if key not in connections:
+            connections[key] = Connection(*key)
+        status, response_headers, body = await connections[key].request(
+            parsed.path or "/", headers)
+        n_bytes += len(body)
+
+        if status not in expected:
+            return "{} for {}".format(status, url), n_bytes
+        if status//100!=3:
+            break
+        url = urlparse.urljoin(url, response_headers.get("location", ""))
+        expected = FOLLOW_STATUSES
+
+    return None, n_bytes
+
+
+async def run_worker(base_url, requests, extra_headers, follow, results):
+    """runs requests on a private set of connections, appending
+    (media type, seconds, error, bytes) tuples to results.
+    """
+    connections = {}
+    try:
+        for vocab_path, media_type in requests:
+            start = time.perf_counter()
+            try:
+                error, n_bytes = await resolve(connections, base_url,
+                    vocab_path, media_type, extra_headers, follow)
+            except (OSError, HTTPError, asyncio.IncompleteReadError
+                    ) as ex:
+                error, n_bytes = "{}: {}".format(type(ex).__name__, ex), 0
+                for conn in connections.values():
+                    conn.close()
+            results.append((media_type, time.perf_counter()-start,
+                error, n_bytes))
+    finally:
+        for conn in connections.values():
+            conn.close()
+
+
+async def run_load(base_url, requests, concurrency, extra_headers, follow):
+    """returns a pair of the result tuples (see run_worker) and the wall
+    time for running requests in concurrency workers.
+    """
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_worker(base_url, requests[i::concurrency],
+            extra_headers, follow, results)
+        for i in range(concurrency)))
+    return results, time.perf_counter()-start
+
+
+def get_percentile(sorted_values, percent):
+    """returns the percent-th percentile of sorted_values (nearest rank).
+    """
+    if not sorted_values:
+        return float("nan")
+    rank = max(0, -(-len(sorted_values)*percent//100)-1)
+    return sorted_values[int(rank)]
+
+
+def summarise(results, wall_time):
+    """returns a dictionary mapping representations (and "all") to
+    dictionaries of statistics.
+    """
+    groups = {"all": results}
+    for result in results:
+        groups.setdefault(result[0], []).append(result)
+
+    summary = {}
+    for name, group in groups.items():
+        latencies = sorted(r[1] for r in group)
+        errors = [r[2] for r in group if r[2]]
+        summary[name] = {
+            "requests": len(group),
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None,
+            "p50_ms": get_percentile(latencies, 50)*1e3,
+            "p95_ms": get_percentile(latencies, 95)*1e3,
+            "p99_ms": get_percentile(latencies, 99)*1e3,
+            "per_second": len(group)/wall_time,
+            "bytes": sum(r[3] for r in group)}
+    return summary
+
+
+def parse_weighted(specs, default):
+    """returns a list of (item, weight) pairs from ITEM=WEIGHT strings,
+    or default if there are none.
+    """
+    if not specs:
+        return default
+    res = []
+    for spec in specs:
+        item, _, weight = spec.rpartition("=")
+        if not item:
+            item, weight = weight, "1"
+        res.append((item, float(weight)))
+    return res
+
+
+def parse_command_line():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Replays a mix of vocabulary requests against a"
+        " repository and reports latencies per representation.")
+    parser.add_argument("base_url",
+        help="URL of the repository root, e.g.,"
+        " http://localhost:8080/rdf/.")
+    parser.add_argument("--requests",
+        help="Number of vocabulary resolutions (default: %(default)s).",
+        type=int,
+        default=10000)
+    parser.add_argument("--concurrency",
+        help="Number of concurrent connections (default: %(default)s).",
+        type=int,
+        default=32)
+    parser.add_argument("--vocab",
+        help="Vocabulary path and relative weight; give this once per"
+        " vocabulary.  The default is a mix dominated by uat and"
+        " datalink/core.",
+        action="append",
+        metavar="PATH=WEIGHT")
+    parser.add_argument("--accept",
+        help="Media type to request and relative weight; give this once"
+        " per media type.",
+        action="append",
+        metavar="TYPE=WEIGHT")
+    parser.add_argument("--accept-encoding",
+        help="Accept-Encoding header to send (default: %(default)s).",
+        dest="accept_encoding",
+        default="gzip")
+    parser.add_argument("--follow",
+        help="Also retrieve the documents redirected to.",
+        action="store_true")
+    parser.add_argument("--seed",
+        help="Seed for drawing the requests (default: %(default)s).",
+        type=int,
+        default=0)
+    parser.add_argument("--json",
+        help="Also write the results to FILE.",
+        metavar="FILE")
+    args = parser.parse_args()
+    if not args.base_url.endswith("/"):
+        args.base_url += "/"
+    return args
+
+
+def main():
+    args = parse_command_line()
+    requests = make_requests(args.requests,
+        parse_weighted(args.vocab, DEFAULT_VOCABS),
+        parse_weighted(args.accept, DEFAULT_ACCEPTS),
+        args.seed)
+    extra_headers = {}
+    if args.accept_encoding:
+        extra_headers["Accept-Encoding"] = args.accept_encoding
+
+    results, wall_time = asyncio.run(run_load(args.base_url, requests,
+        args.concurrency, extra_headers, args.follow))
+    summary = summarise(results, wall_time)
+
+    print("{:<27} {:>8} {:>6} {:>8} {:>8} {:>8} {:>9}".format(
+        "representation", "requests", "errors",
+        "p50 ms", "p95 ms", "p99 ms", "req/s"))
+    for name, stats in sorted(summary.items(),
+            key=lambda item: (item[0]=="all", item[0])):
+        print("{:<27} {:>8} {:>6} {:>8.2f} {:>8.2f} {:>8.2f} {:>9.1f}".format(
+            name, stats["requests"], stats["errors"], stats["p50_ms"],
+            stats["p95_ms"], stats["p99_ms"], stats["per_second"]))
+    if summary["all"]["errors"]:
+        print("\nFirst error: {}".format(summary["all"]["first_error"]))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                    "base_url": args.base_url,
+                    "concurrency": args.concurrency,
+                    "follow": args.follow,
+                    "wall_time": wall_time,
+                    "results": summary},
+                f, indent="  ")
+
+    if summary["all"]["errors"]:
+        sys.exit(1)
+
+
+if __name__=="__main__":
+    main()
+
+# vi:sw=4:et:sta
@@ -0,0 +1,112 @@
+"""
+Checks that the native RDF serialisers describe the same graphs.
+
+convert writes RDF/XML and JSON-LD without rdflib (see
+Vocabulary.write_rdfx and Vocabulary.write_jsonld).  For each vocabulary
+given (default: all in the configuration), this writes the turtle, the
+RDF/XML, and the JSON-LD into a temporary directory, parses them with
+rdflib, and checks that the graphs from RDF/XML and JSON-LD are
+isomorphic to the one from turtle.  The times rdflib takes to parse
+are reported, too.
+
+Vocabularies that cannot be loaded are reported and skipped.  The exit
+code is 1 if any graphs differ.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import convert
+
+
+# pairs of (extension, rdflib format) of the files compared to the turtle
+CHECKED_FORMATS = [
+    (".rdf", "xml"),
+    (".json", "json-ld"),
+]
+
+
+def parse_graph(file_name, rdf_format, base_uri):
+    """returns a pair of (rdflib graph, seconds) for parsing file_name.
+    """
+    import rdflib
+
+    start = time.perf_counter()
+    graph = rdflib.Graph()
+    graph.parse(file_name, format=rdf_format, publicID=base_uri)
+    return graph, time.perf_counter()-start
+
+
+def check_vocabulary(config, vocab_name, work_dir):
+    """returns a list of problems with the serialisations of vocab_name.
+
+    The files are written into work_dir.
+    """
+    from rdflib.compare import isomorphic
+
+    try:
+        voc = convert.get_vocabulary(config, vocab_name)
+    except convert.ReportableError as ex:
+        print("{}: skipped ({})".format(vocab_name, ex))
+        return []
+
+    with convert.work_dir(os.path.join(work_dir, vocab_name)):
+        voc.write_turtle()
+        voc.write_rdfx()
+        voc.write_jsonld()
+
+        reference, ttl_time = parse_graph(
+            voc.name+".ttl", "turtle", voc.baseuri)
+        timings = ["ttl {:.2f} s".format(ttl_time)]
+        problems = []
+        for ext, rdf_format in CHECKED_FORMATS:
+            graph, parse_time = parse_graph(
+                voc.name+ext, rdf_format, voc.baseuri)
+            timings.append("{} {:.2f} s".format(ext[1:], parse_time))
+            if not isomorphic(reference, graph):
+                problems.append("{}: {} graph differs from turtle"
+                    " ({} vs. {} triples)".format(
+                        vocab_name, ext, len(graph), len(reference)))
+
+    print("{}: {} triples; parsing {}".format(
+        vocab_name, len(reference), ", ".join(timings)))
+    return problems
+
+
+def parse_command_line():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Checks that convert's RDF serialisations have the"
+        " same triples.")
+    parser.add_argument("vocab_names",
+        help="Names (i.e., vocabs.conf sections) of the vocabularies"
+        " to check (default: all).",
+        nargs="*")
+    parser.add_argument("--config",
+        help="Name of the vocabulary config file (default: %(default)s).",
+        dest="config_name",
+        default="vocabs.conf")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_command_line()
+    config = convert.parse_config(args.config_name)
+
+    problems = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for vocab_name in args.vocab_names or config.sections():
+            problems.extend(check_vocabulary(config, vocab_name, work_dir))
+
+    if problems:
+        print("\n".join(problems))
+        sys.exit(1)
+    print("All serialisations agree.")
+
+
+if __name__=="__main__":
+    main()
+
+# vi:sw=4:et:sta
@@ -0,0 +1,70 @@
+"""
+Times convert.parse_relation_column on pathological inputs.
+
+For each kind of input, the size is increased geometrically, and the
+time per input character is reported; for a linear parser, that should
+stay roughly constant.  The parser's cache is bypassed except in the
+last line, which shows what a cache hit costs.
+"""
+
+import timeit
+
+import convert
+
+parse_uncached = convert.parse_relation_column.__wrapped__
+
+# functions returning pathological relation strings of (roughly) size n
+INPUT_MAKERS = {
+    "deep nesting": lambda n:
+        "skos:related("+"("*(n//2)+"x"+")"*(n//2)+")",
+    "long object": lambda n:
+        "skos:altLabel("+"word "*(n//5)+")",
+    "many predicates": lambda n:
+        "ivoasem:preliminary "*(n//20),
+    "many objects": lambda n:
+        "skos:related(term) "*(n//19),
+}
+
+
+def time_per_char(relations, number=5):
+    """returns the best time per character of parsing relations
+    in nanoseconds.
+    """
+    best = min(timeit.repeat(
+        lambda: parse_uncached(relations), number=number, repeat=3))
+    return best/number/len(relations)*1e9
+
+
+def parse_command_line():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Times the relation parser on pathological inputs.")
+    parser.add_argument("--max-size",
+        help="Largest input size in characters (default: %(default)s).",
+        type=int,
+        default=10**6)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_command_line()
+
+    for label, make_input in INPUT_MAKERS.items():
+        size, timings = 1000, []
+        while size<=args.max_size:
+            timings.append((size, time_per_char(make_input(size))))
+            size *= 10
+        print("{}: {}".format(label, ", ".join(
+            "{}: {:.0f} ns/char".format(size, t) for size, t in timings)))
+
+    relations = "skos:altLabel(Some Observatory) ivoasem:preliminary"
+    convert.parse_relation_column(relations)
+    print("cache hit: {:.0f} ns".format(min(timeit.repeat(
+        lambda: convert.parse_relation_column(relations),
+        number=10000, repeat=3))/10000*1e9))
+
+
+if __name__=="__main__":
+    main()
+
+# vi:sw=4:et:sta
@@ -0,0 +1,141 @@
+"""
+Compares the native SKOS reader with the skosify-based one.
+
+For each SKOS vocabulary given (default: uat), this reads the terms
+through skosify (bypassing the cache) and through the native reader
+and checks that both yield the same term records.  It then writes the
+artefacts (turtle, HTML, JSON-LD, RDF/XML, and desise) from both sets of
+records and checks that they are byte-identical, which they must be,
+as the build output is not supposed to depend on the reader.  The
+times taken by both readers are reported as well.
+
+uat's skos:related is already symmetric.  To also exercise the
+inferences uat does not need, pass --synthetic N to additionally
+compare the readers on a synthetic SKOS vocabulary with N terms (see
+benchmarks.synth).
+
+The exit code is 1 if the readers disagree.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import convert
+from benchmarks import synth
+
+
+# the writers whose output must not depend on the reader
+ARTEFACT_WRITERS = ["write_turtle", "write_html", "write_jsonld",
+    "write_rdfx", "write_desise"]
+
+
+def get_artefacts(voc, records, dest_dir):
+    """returns a dictionary mapping file names to the bytes written
+    by ARTEFACT_WRITERS for voc with terms made from records.
+    """
+    voc.terms = {}
+    for record in records:
+        term = convert.Term(voc, *record)
+        voc.terms[term.term] = term
+    voc.inverted_wider = convert.invert_wider(voc)
+    voc.artefacts = set()
+
+    with convert.work_dir(dest_dir):
+        for writer in ARTEFACT_WRITERS:
+            getattr(voc, writer)()
+
+        artefacts = {}
+        for name in sorted(voc.artefacts):
+            with open(name, "rb") as f:
+                artefacts[name] = f.read()
+    return artefacts
+
+
+def time_reader(reader):
+    """returns a pair of (records, seconds) for calling reader.
+    """
+    start = time.perf_counter()
+    records = reader()
+    return records, time.perf_counter()-start
+
+
+def compare_readers(config, vocab_name):
+    """returns a list of differences between the readers for vocab_name.
+    """
+    voc = convert.get_vocabulary(config, vocab_name)
+    skosify_records, skosify_time = time_reader(voc._read_skos_records)
+    native_records, native_time = time_reader(voc._read_native_records)
+    print("{}: skosify {:.2f} s, native {:.2f} s, {} terms".format(
+        vocab_name, skosify_time, native_time, len(native_records)))
+
+    from_skosify = dict((r[0], r) for r in skosify_records)
+    from_native = dict((r[0], r) for r in native_records)
+    differences = ["{}: only from skosify".format(term)
+        for term in set(from_skosify)-set(from_native)]
+    differences.extend("{}: only from native".format(term)
+        for term in set(from_native)-set(from_skosify))
+    for term in set(from_skosify)&set(from_native):
+        if from_skosify[term]!=from_native[term]:
+            differences.append("{}: {} vs. {}".format(
+                term, from_skosify[term], from_native[term]))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        skosify_artefacts = get_artefacts(voc, skosify_records,
+            os.path.join(work_dir, "skosify"))
+        native_artefacts = get_artefacts(voc, native_records,
+            os.path.join(work_dir, "native"))
+    for name in sorted(set(skosify_artefacts)|set(native_artefacts)):
+        if skosify_artefacts.get(name)!=native_artefacts.get(name):
+            differences.append("{}: {} differs between the readers".format(
+                vocab_name, name))
+    return differences
+
+
+def parse_command_line():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Compares the native SKOS reader with skosify.")
+    parser.add_argument("vocab_names",
+        help="Names (i.e., vocabs.conf sections) of the SKOS vocabularies"
+        " to compare (default: uat).",
+        nargs="*",
+        default=["uat"])
+    parser.add_argument("--synthetic",
+        help="Also compare the readers on a synthetic vocabulary with"
+        " N terms.",
+        type=int,
+        metavar="N")
+    parser.add_argument("--config",
+        help="Name of the vocabulary config file (default: %(default)s).",
+        dest="config_name",
+        default="vocabs.conf")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_command_line()
+    config = convert.parse_config(args.config_name)
+
+    differences = []
+    for vocab_name in args.vocab_names:
+        differences.extend(compare_readers(config, vocab_name))
+
+    if args.synthetic:
+        with tempfile.TemporaryDirectory() as src_dir:
+            differences.extend(compare_readers(
+                synth.write_vocabulary(src_dir, "SKOS", args.synthetic,
+                    relation_density=2),
+                synth.SYNTH_NAME))
+
+    if differences:
+        print("\n".join(sorted(differences)))
+        sys.exit(1)
+    print("The readers agree.")
+
+
+if __name__=="__main__":
+    main()
+
+# vi:sw=4:et:sta
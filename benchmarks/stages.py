@@ -0,0 +1,226 @@
+"""
+Times and measures the stages of building synthetic vocabularies.
+
+For each size given, this writes a synthetic vocabulary (see
+benchmarks.synth) into a temporary directory and loads it through
+convert.get_vocabulary.  On that instance, it then runs each stage in
+STAGES once for timing and once more under tracemalloc for the peak
+memory; tracing slows down python code considerably, so the times come
+from the untraced run.  The writers write into the temporary directory.
+
+With --save-baseline, the results are written to a JSON file; with
+--baseline, they are compared to such a file.  A stage regresses if it
+takes longer than --time-threshold times its baseline time or needs
+more than --memory-threshold times its baseline peak memory.  If
+anything regressed, the exit code is 1.  Baselines are only meaningful
+on the machine they were made on.
+
+The default sizes are about those of facility and ten times that.
+Going to 10**6 terms takes minutes and a few GiB of memory for the
+CSV flavours; for SKOS, this mostly measures skosify and rdflib.  The
+SKOS records cache (see convert.SKOSVocabulary) is kept in the temporary
+directory and emptied before each read, so _read_terms_source always
+measures a first build rather than a cache hit.
+"""
+
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import convert
+from benchmarks import synth
+
+
+def _read_terms_source(voc):
+    # parse_relation_column and, for SKOS, the records cache would make
+    # this measure cache hits; start cold, as in a first build.
+    # measure_vocabulary points CACHE_DIR into its temporary directory.
+    convert.parse_relation_column.cache_clear()
+    shutil.rmtree(convert.CACHE_DIR, ignore_errors=True)
+    voc._read_terms_source()
+
+
+def _invert_wider(voc):
+    voc.inverted_wider = convert.invert_wider(voc)
+
+
+def _write_precompressed(voc):
+    # compressed files matching their sources are not written again;
+    # remove them so each run compresses everything
+    for name in voc.artefacts:
+        if name.endswith((".gz", ".br")) and os.path.exists(name):
+            os.unlink(name)
+    voc.write_precompressed()
+
+
+# the stages measured, as (name, function taking the vocabulary) pairs
+STAGES = [
+    ("_read_terms_source", _read_terms_source),
+    ("invert_wider", _invert_wider),
+    ("write_turtle", lambda voc: voc.write_turtle()),
+    ("write_html", lambda voc: voc.write_html()),
+    ("write_jsonld", lambda voc: voc.write_jsonld()),
+    ("write_rdfx", lambda voc: voc.write_rdfx()),
+    ("write_desise", lambda voc: voc.write_desise()),
+    ("write_precompressed", _write_precompressed),
+    ("write_manifest", lambda voc: voc.write_manifest()),
+]
+
+
+def measure_stage(stage, voc):
+    """returns a pair of (seconds, peak bytes) for running stage
+    on voc.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    stage(voc)
+    elapsed = time.perf_counter()-start
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        stage(voc)
+        peak = tracemalloc.get_traced_memory()[1]-base
+    finally:
+        tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def measure_vocabulary(flavour, n_terms, generator_kwargs):
+    """returns a dictionary mapping stage names to dictionaries with
+    seconds and peak_bytes for a synthetic vocabulary.
+    """
+    results, cache_dir = {}, convert.CACHE_DIR
+    with tempfile.TemporaryDirectory() as work_dir:
+        # keep the SKOS records cache away from the repository's
+        convert.CACHE_DIR = os.path.join(work_dir, "cache")
+        try:
+            config = synth.write_vocabulary(
+                work_dir, flavour, n_terms, **generator_kwargs)
+            voc = convert.get_vocabulary(config, synth.SYNTH_NAME)
+
+            with convert.work_dir(os.path.join(work_dir, "out")):
+                for stage_name, stage in STAGES:
+                    seconds, peak = measure_stage(stage, voc)
+                    results[stage_name] = {
+                        "seconds": seconds,
+                        "peak_bytes": peak}
+        finally:
+            convert.CACHE_DIR = cache_dir
+    return results
+
+
+def get_run_key(flavour, n_terms):
+    """returns the key under which results for a synthetic vocabulary
+    are kept in baselines.
+    """
+    return "{} {}".format(flavour, n_terms)
+
+
+def compare_stage(result, reference, time_threshold, memory_threshold):
+    """returns a (possibly empty) list of regression messages for result
+    compared to reference.
+
+    Both are dictionaries as in the values of measure_vocabulary's
+    return value.
+    """
+    messages = []
+    if result["seconds"]>reference["seconds"]*time_threshold:
+        messages.append("time {:.3f} s vs. {:.3f} s".format(
+            result["seconds"], reference["seconds"]))
+    if result["peak_bytes"]>reference["peak_bytes"]*memory_threshold:
+        messages.append("peak memory {:.1f} MiB vs. {:.1f} MiB".format(
+            result["peak_bytes"]/2**20, reference["peak_bytes"]/2**20))
+    return messages
+
+
+def parse_command_line():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Times the build stages on synthetic vocabularies.")
+    parser.add_argument("--sizes",
+        help="Numbers of terms of the vocabularies to measure"
+        " (default: %(default)s).",
+        type=int,
+        nargs="+",
+        default=[8000, 80000])
+    synth.add_generator_arguments(parser)
+    parser.add_argument("--baseline",
+        help="Compare the results to the baseline in FILE.",
+        dest="baseline",
+        metavar="FILE")
+    parser.add_argument("--save-baseline",
+        help="Write the results as a baseline to FILE.",
+        dest="save_baseline",
+        metavar="FILE")
+    parser.add_argument("--time-threshold",
+        help="Report stages taking more than FACTOR times their"
+        " baseline time (default: %(default)s).",
+        dest="time_threshold",
+        type=float,
+        default=1.5,
+        metavar="FACTOR")
+    parser.add_argument("--memory-threshold",
+        help="Report stages with a peak memory of more than FACTOR times"
+        " their baseline peak memory (default: %(default)s).",
+        dest="memory_threshold",
+        type=float,
+        default=1.2,
+        metavar="FACTOR")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_command_line()
+    generator_kwargs = synth.get_generator_kwargs(args)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline_doc = json.load(f)
+        if baseline_doc["generator"]!=generator_kwargs:
+            sys.stderr.write("Warning: Baseline made with different generator"
+                " parameters {}\n".format(baseline_doc["generator"]))
+        baseline = baseline_doc["runs"]
+
+    runs, regressions = {}, []
+    for n_terms in args.sizes:
+        run_key = get_run_key(args.flavour, n_terms)
+        runs[run_key] = measure_vocabulary(
+            args.flavour, n_terms, generator_kwargs)
+
+        print("{} terms, flavour {}:".format(n_terms, args.flavour))
+        for stage_name, result in runs[run_key].items():
+            print("  {:<22} {:8.3f} s {:9.1f} MiB".format(
+                stage_name, result["seconds"], result["peak_bytes"]/2**20))
+
+            reference = baseline.get(run_key, {}).get(stage_name)
+            if reference:
+                for msg in compare_stage(result, reference,
+                        args.time_threshold, args.memory_threshold):
+                    regressions.append("{}, {}: {}".format(
+                        run_key, stage_name, msg))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                    "generator": generator_kwargs,
+                    "runs": runs},
+                f, indent="  ")
+
+    if regressions:
+        print("\nRegressions:\n  "+"\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__=="__main__":
+    main()
+
+# vi:sw=4:et:sta
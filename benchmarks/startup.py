@@ -0,0 +1,80 @@
+"""
+Measures how long it takes to import convert.py.
+
+The import is timed in fresh interpreters (so interpreter startup itself
+is not counted), and the median over a number of runs is compared
+against a fixed budget.  This also checks that importing convert does
+not pull in rdflib or skosify, which are only needed for SKOS input.
+
+The program exits with a non-zero status if the budget is exceeded.
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+
+# heavy modules that must only be imported on demand
+LAZY_MODULES = ["rdflib", "skosify"]
+
+# timing code run in the child interpreters
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import convert
+elapsed = time.perf_counter()-start
+print(json.dumps({
+    "elapsed": elapsed,
+    "loaded": [m for m in %r if m in sys.modules]}))
+""" % LAZY_MODULES
+
+
+def time_import():
+    """returns a pair of (seconds, loaded lazy modules) for one import
+    of convert in a fresh interpreter.
+    """
+    output = subprocess.check_output([sys.executable, "-c", PROBE])
+    res = json.loads(output)
+    return res["elapsed"], res["loaded"]
+
+
+def parse_command_line():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Checks the time for importing convert against"
+            " a budget.")
+    parser.add_argument("--budget",
+        help="Maximal acceptable median import time in seconds"
+        " (default: %(default)s).",
+        type=float,
+        default=0.1)
+    parser.add_argument("--repeat",
+        help="Number of imports to time (default: %(default)s).",
+        type=int,
+        default=11)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_command_line()
+
+    timings = []
+    for _ in range(args.repeat):
+        elapsed, loaded = time_import()
+        if loaded:
+            sys.exit("Importing convert loads {}".format(", ".join(loaded)))
+        timings.append(elapsed)
+
+    median = statistics.median(timings)
+    print("import convert: median {:.1f} ms, min {:.1f} ms,"
+        " budget {:.1f} ms".format(
+            median*1e3, min(timings)*1e3, args.budget*1e3))
+
+    if median>args.budget:
+        sys.exit("Import time budget exceeded")
+
+
+if __name__=="__main__":
+    main()
+
+# vi:sw=4:et:sta
@@ -0,0 +1,278 @@
+"""
+Generates synthetic vocabularies for benchmarking.
+
+The terms form a forest: top-level terms are added until there are
+enough terms, and each term above the given depth has a fixed number of
+narrower terms.  On average, each term has relation_density relations
+beyond its parent (related terms, exact matches, alternative labels,
+and the occasional deprecation).  A fixed seed makes the result
+reproducible.
+
+write_csv and write_skos write such terms in our custom CSV format and
+as SKOS RDF/XML, respectively, and make_config returns a ConfigParser
+from which convert.get_vocabulary can load what they wrote.
+
+Run this as a program to write a synthetic vocabulary somewhere for
+inspection.
+"""
+
+import csv
+import os
+import random
+from configparser import ConfigParser
+
+import convert
+
+
+# the vocabulary name and URI for synthetic vocabularies
+SYNTH_NAME = "synthetic"
+SYNTH_URI = "http://www.ivoa.net/rdf/synthetic"
+SYNTH_SCHEME_URI = "http://example.org/synthetic-scheme"
+
+# flavours we can generate, mapped to the source file name
+SOURCE_NAMES = {
+    "RDF Class": "terms.csv",
+    "RDF Property": "terms.csv",
+    "SKOS CSV": "terms.csv",
+    "SKOS": "terms.skos",
+}
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def get_term_name(index):
+    """returns the name of the term number index.
+
+    The names are spread over all letters so sharded HTML gets
+    realistic pages.
+    """
+    return "{}{}-term-{}".format(
+        LETTERS[index%26], LETTERS[index//26%26], index)
+
+
+def iter_levels(n_terms, depth, branching):
+    """yields the hierarchy levels (1 for top-level terms) of n_terms
+    terms in depth-first order.
+    """
+    stack = []
+    for _ in range(n_terms):
+        if not stack:
+            stack.append(1)
+        level = stack.pop()
+        yield level
+        if level<depth:
+            stack.extend([level+1]*branching)
+
+
+def make_relations(rng, index, n_terms, relation_density):
+    """returns a list of (predicate, object) pairs for term number index.
+
+    object is None for predicates without objects, a term name for
+    relations to other terms, and a URI or a literal otherwise.
+    """
+    n_relations = int(relation_density)
+    if rng.random()<relation_density-n_relations:
+        n_relations += 1
+
+    relations = []
+    for _ in range(n_relations):
+        kind = rng.random()
+        if kind<0.4:
+            relations.append(("skos:related",
+                get_term_name(rng.randrange(n_terms))))
+        elif kind<0.7:
+            relations.append(("skos:exactMatch",
+                "http://example.org/synthetic/{}".format(
+                    rng.randrange(10*n_terms))))
+        elif kind<0.98:
+            relations.append(("skos:altLabel",
+                "Alternative label {} for term {}".format(
+                    rng.randrange(100), index)))
+        else:
+            relations.extend([
+                ("ivoasem:deprecated", None),
+                ("ivoasem:useInstead", get_term_name(
+                    rng.randrange(n_terms)))])
+    return relations
+
+
+def make_terms(n_terms, depth=3, branching=10, relation_density=0.5,
+        seed=0):
+    """returns a list of dictionaries describing synthetic terms.
+
+    Each dictionary has the keys name, level, label, description,
+    parent (a term name or None), and relations (see make_relations).
+    """
+    rng = random.Random(seed)
+    terms, parents = [], []
+    for index, level in enumerate(iter_levels(n_terms, depth, branching)):
+        name = get_term_name(index)
+        del parents[level-1:]
+        terms.append({
+            "name": name,
+            "level": level,
+            "label": "Synthetic term number {}".format(index),
+            "description": "" if index%3==0 else
+                "This is the description of synthetic term {}, which is"
+                " on level {} of its hierarchy.".format(index, level),
+            "parent": parents[-1] if parents else None,
+            "relations": make_relations(
+                rng, index, n_terms, relation_density)})
+        parents.append(name)
+    return terms
+
+
+def write_csv(terms, dest_path):
+    """writes terms in our custom CSV format to dest_path.
+    """
+    with open(dest_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        for term in terms:
+            writer.writerow([
+                term["name"],
+                term["level"],
+                term["label"],
+                term["description"],
+                " ".join(predicate if ob is None else
+                        "{}({})".format(predicate, ob)
+                    for predicate, ob in term["relations"])])
+
+
+def write_skos(terms, dest_path):
+    """writes terms as SKOS RDF/XML to dest_path.
+    """
+    escape = convert.escape_xml
+    with open(dest_path, "w", encoding="utf-8") as f:
+        f.write(convert.RDFX_HEADER)
+        # without a concept scheme, skosify makes up one within our
+        # namespace, which would then look like a term.
+        f.write('  <skos:ConceptScheme rdf:about="{}">\n'
+            '    <rdfs:label xml:lang="en">Synthetic</rdfs:label>\n'
+            '  </skos:ConceptScheme>\n'.format(SYNTH_SCHEME_URI))
+        for term in terms:
+            f.write('  <skos:Concept rdf:about="{}#{}">\n'.format(
+                SYNTH_URI, term["name"]))
+            f.write('    <skos:prefLabel xml:lang="en">{}</skos:prefLabel>\n'
+                .format(escape(term["label"])))
+            if term["description"]:
+                f.write('    <skos:definition xml:lang="en">{}'
+                    '</skos:definition>\n'.format(escape(term["description"])))
+            if term["parent"]:
+                f.write('    <skos:broader rdf:resource="{}#{}"/>\n'.format(
+                    SYNTH_URI, term["parent"]))
+
+            for predicate, ob in term["relations"]:
+                if ob is None:
+                    f.write('    <{}/>\n'.format(predicate))
+                elif predicate=="skos:altLabel":
+                    f.write('    <skos:altLabel xml:lang="en">{}'
+                        '</skos:altLabel>\n'.format(escape(ob)))
+                elif convert.is_URI(ob):
+                    f.write('    <{} rdf:resource="{}"/>\n'.format(
+                        predicate, escape(ob, quote=True)))
+                else:
+                    f.write('    <{} rdf:resource="{}#{}"/>\n'.format(
+                        predicate, SYNTH_URI, ob))
+            f.write('  </skos:Concept>\n')
+        f.write('</rdf:RDF>\n')
+
+
+def make_config(src_dir, flavour):
+    """returns a ConfigParser defining the synthetic vocabulary with
+    flavour in src_dir.
+    """
+    config = ConfigParser()
+    config[SYNTH_NAME] = {
+        "flavour": flavour,
+        "timestamp": "2000-01-01",
+        "title": "Synthetic benchmark vocabulary",
+        "description": "Generated by benchmarks.synth.",
+        "authors": "Nobody",
+        "baseuri": SYNTH_URI,
+        "filename": os.path.join(src_dir, SOURCE_NAMES[flavour]),
+    }
+    return config
+
+
+def write_vocabulary(src_dir, flavour, n_terms, **kwargs):
+    """writes a synthetic vocabulary with flavour and n_terms terms to
+    src_dir and returns a ConfigParser for it.
+
+    kwargs are passed on to make_terms.
+    """
+    terms = make_terms(n_terms, **kwargs)
+    config = make_config(src_dir, flavour)
+    dest_path = config[SYNTH_NAME]["filename"]
+    if flavour=="SKOS":
+        write_skos(terms, dest_path)
+    else:
+        write_csv(terms, dest_path)
+    return config
+
+
+def add_generator_arguments(parser):
+    """adds the options controlling the synthetic vocabularies to
+    the argparse parser.
+    """
+    parser.add_argument("--flavour",
+        help="Flavour of the vocabulary (default: %(default)s).",
+        choices=sorted(SOURCE_NAMES),
+        default="RDF Class")
+    parser.add_argument("--depth",
+        help="Number of levels in the term hierarchy"
+        " (default: %(default)s).",
+        type=int,
+        default=3)
+    parser.add_argument("--branching",
+        help="Number of narrower terms of each term not on the"
+        " lowest level (default: %(default)s).",
+        type=int,
+        default=10)
+    parser.add_argument("--relation-density",
+        help="Average number of relations per term besides the parent"
+        " (default: %(default)s).",
+        dest="relation_density",
+        type=float,
+        default=0.5)
+    parser.add_argument("--seed",
+        help="Seed for the random relations (default: %(default)s).",
+        type=int,
+        default=0)
+
+
+def get_generator_kwargs(args):
+    """returns keyword arguments for make_terms from parsed command line
+    arguments (see add_generator_arguments).
+    """
+    return {
+        "depth": args.depth,
+        "branching": args.branching,
+        "relation_density": args.relation_density,
+        "seed": args.seed}
+
+
+def parse_command_line():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Writes a synthetic vocabulary.")
+    parser.add_argument("dest_dir",
+        help="Directory to write the vocabulary source to.")
+    parser.add_argument("n_terms",
+        help="Number of terms to generate.",
+        type=int)
+    add_generator_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_command_line()
+    os.makedirs(args.dest_dir, exist_ok=True)
+    config = write_vocabulary(args.dest_dir, args.flavour, args.n_terms,
+        **get_generator_kwargs(args))
+    print("Wrote {}".format(config[SYNTH_NAME]["filename"]))
+
+
+if __name__=="__main__":
+    main()
+
+# vi:sw=4:et:sta
@@ -0,0 +1,64 @@
+"""
+Reports how much memory vocabularies take once loaded.
+
+For each vocabulary given (default: facility and uat), this loads it
+through convert.get_vocabulary under tracemalloc and reports the memory
+retained after loading, in total and per term.  Transient memory (e.g.,
+what skosify needs while reading SKOS) is not included, and neither are
+modules imported on first use, as each vocabulary is loaded once before
+it is measured.
+"""
+
+import gc
+import tracemalloc
+
+import convert
+
+
+def measure_vocabulary(config, vocab_name):
+    """returns a pair of (retained bytes, number of terms) for loading
+    vocab_name from config.
+    """
+    convert.get_vocabulary(config, vocab_name)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        vocab = convert.get_vocabulary(config, vocab_name)
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]-before
+    finally:
+        tracemalloc.stop()
+    return retained, len(vocab.terms)
+
+
+def parse_command_line():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Reports memory retained by loaded vocabularies.")
+    parser.add_argument("vocab_names",
+        help="Names (i.e., vocabs.conf sections) of the vocabularies"
+        " to measure (default: facility uat).",
+        nargs="*",
+        default=["facility", "uat"])
+    parser.add_argument("--config",
+        help="Name of the vocabulary config file (default: %(default)s).",
+        dest="config_name",
+        default="vocabs.conf")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_command_line()
+    config = convert.parse_config(args.config_name)
+
+    for vocab_name in args.vocab_names:
+        retained, n_terms = measure_vocabulary(config, vocab_name)
+        print("{}: {} terms, {:.1f} MiB, {:.0f} bytes per term".format(
+            vocab_name, n_terms, retained/2**20, retained/n_terms))
+
+
+if __name__=="__main__":
+    main()
+
+# vi:sw=4:et:sta
@@ -6,7 +6,8 @@
 A script to convert the CSV input format to various outputs.
 
 Dependencies: python3, python3-rdflib, skosify (not packaged yet; see
-https://pypi.org/project/skosify/)
+https://pypi.org/project/skosify/); if python3-brotli is available,
+brotli-compressed artefacts are written, too.
 
 See Appendix A of Vocabularies in the VO 2 for what this is and what
 it's for.
@@ -22,25 +23,21 @@ from xml.etree import ElementTree as etree
 
 import contextlib
 import csv
-import itertools
+import functools
+import gzip
+import hashlib
 import json
 import os
 import re
-import subprocess
 import textwrap
 import shutil
 import sys
-import urllib.parse
-import weakref
+import time
+import tracemalloc
 
-import rdflib
-
-try:
-    import skosify
-    from rdflib.term import URIRef
-except ImportError:
-    sys.stderr.write("skosify and/or rdflib python modules missing;"
-        " this will break as soon as SKOS vocabularies are processed.\n")
+# rdflib and skosify are only imported when SKOS input is actually
+# read (see SKOSVocabulary); importing them is by far the most expensive
+# part of our startup.
 
 
 # Minimal required keys for a vocabulary construction
@@ -64,25 +61,72 @@ FULL_TERM_PATTERN = r"[\w\d#:/_.*%-]+"
 # an RE our terms themselves must match
 TERM_PATTERN = r"[\w\d_-]+"
 
+FULL_TERM_RE = re.compile(FULL_TERM_PATTERN+"$")
+TERM_RE = re.compile(TERM_PATTERN+"$")
+
 IVOA_RDF_URI = "http://www.ivoa.net/rdf/"
 
+# vocabularies with more terms than this get their HTML split up into
+# several pages (unless overridden by shardthreshold in vocabs.conf)
+HTML_SHARD_THRESHOLD = 3000
+
+# the name of the file with the sha256 hashes of all files in a
+# vocabulary version directory, in the format of sha256sum; see
+# Vocabulary.write_manifest
+MANIFEST_NAME = "SHA256SUMS"
+
+# where to keep the term records extracted from SKOS sources (see
+# SKOSVocabulary); set IVOA_VOCAB_CACHE to put them elsewhere.
+CACHE_DIR = os.environ.get("IVOA_VOCAB_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+# bump this when changing what SKOSVocabulary._read_one_term returns so
+# cached records are not used any more.
+SKOS_CACHE_VERSION = "2"
+
+# the subdirectory of CACHE_DIR keeping what the built vocabulary
+# versions were made from (see get_build_key_path); this is build
+# state and hence must not be in the published tree.
+BUILD_KEY_DIR = "buildkeys"
+
+# files with these extensions get precompressed siblings (see
+# write_precompressed)
+PRECOMPRESSED_EXTENSIONS = (
+    ".ttl", ".rdf", ".json", ".desise", ".html", ".css", ".js")
+
+# brotli quality for precompressed files; the maximum of 11 takes
+# several seconds per megabyte and hardly gains anything on our files
+BROTLI_QUALITY = 9
+
 
 HT_ACCESS_TEMPLATE = """# rewrite conditions for {name}
 RewriteCond %{{HTTP_ACCEPT}} application/rdf\\+xml
-RewriteRule ^{path}/?$ {path}/{timestamp}/{name}.rdf [R=303]
+RewriteRule ^{path}/?$ {path}/{timestamp}/{name}.rdf [R=303,E=vocab_negotiated:1]
 
 RewriteCond %{{HTTP_ACCEPT}} text/turtle
-RewriteRule ^{path}/?$ {path}/{timestamp}/{name}.ttl [R=303]
+RewriteRule ^{path}/?$ {path}/{timestamp}/{name}.ttl [R=303,E=vocab_negotiated:1]
 
 RewriteCond %{{HTTP_ACCEPT}} application/ld\\+json
-RewriteRule ^{path}/?$ {path}/{timestamp}/{name}.json [R=303]
+RewriteRule ^{path}/?$ {path}/{timestamp}/{name}.json [R=303,E=vocab_negotiated:1]
 
 RewriteCond %{{HTTP_ACCEPT}} application/x-desise\\+json
-RewriteRule ^{path}/?$ {path}/{timestamp}/{name}.desise [R=303]
+RewriteRule ^{path}/?$ {path}/{timestamp}/{name}.min.desise [R=303,E=vocab_negotiated:1]
 
-RewriteRule ^{path}/?$ {path}/{timestamp}/{name}.html [R=303]
+RewriteRule ^{path}/?$ {path}/{timestamp}/{name}.html [R=303,E=vocab_negotiated:1]
 """
 
+# pairs of media types and the files delivered for them in content
+# negotiation; the last pair is what clients get that ask for none of
+# the others.  This must agree with HT_ACCESS_TEMPLATE, which also marks
+# the redirects with vocab_negotiated so make-rdf-index.py's
+# configuration can give them a short lifetime in caches.
+NEGOTIATED_FILES = [
+    ("application/rdf+xml", "{name}.rdf"),
+    ("text/turtle", "{name}.ttl"),
+    ("application/ld+json", "{name}.json"),
+    ("application/x-desise+json", "{name}.min.desise"),
+    ("text/html", "{name}.html")]
+
 NAMESPACES = {"dc": "http://purl.org/dc/terms/",
               "rdfs": "http://www.w3.org/2000/01/rdf-schema#",
               "owl": "http://www.w3.org/2002/07/owl#",
@@ -92,6 +136,9 @@ NAMESPACES = {"dc": "http://purl.org/dc/terms/",
               "ivoasem": "http://www.ivoa.net/rdf/ivoasem#",
               "skos": "http://www.w3.org/2004/02/skos/core#"}
 
+# NAMESPACES as prefixes for ElementTree's {uri}name notation
+ET_NS = dict((prefix, "{"+uri+"}") for prefix, uri in NAMESPACES.items())
+
 TTL_HEADER_TEMPLATE = """@base {baseuri}.
 @prefix : <#>.
 
@@ -116,10 +163,152 @@ dc:description a owl:AnnotationProperty.
 
 """
 
+RDFX_HEADER = """<?xml version="1.0" encoding="utf-8"?>
+<rdf:RDF
+""" + \
+'\n'.join([f'  xmlns:{prefix}="{namespace}"'
+           for prefix, namespace in NAMESPACES.items()]) + \
+""">
+"""
+
+# the head of our JSON-LD documents; we always compact to NAMESPACES
+JSONLD_HEADER = '{{\n  "@context": {},\n  "@graph": [\n'.format(
+    json.dumps(NAMESPACES))
+
 
 JAVASCRIPT = """
 """
 
+# javascript filling the relation popups of vocabularies with
+# lazypopups from the desise (for narrower) and JSON-LD (for everything
+# else) files on first opening.  The configuration comes from data
+# attributes on table.terms (see Vocabulary.get_html_body).
+LAZY_POPUP_SCRIPT = """
+var lazyPopupSources = {};
+
+function fetchPopupSource(url, index_by) {
+    if (!lazyPopupSources[url]) {
+        lazyPopupSources[url] = fetch(url).then(function(response) {
+            return response.json();
+        }).then(function(doc) {
+            if (!index_by) {
+                return doc;
+            }
+            var index = {};
+            doc["@graph"].forEach(function(node) {
+                index[node[index_by]] = node;
+            });
+            return index;
+        });
+    }
+    return lazyPopupSources[url];
+}
+
+function getLazyTermHref(config, term) {
+    if (config.shardprefix) {
+        var key = term.charAt(0).toLowerCase();
+        if (!/^[a-z]$/.test(key)) {
+            key = "other";
+        }
+        return config.shardprefix+key+".html#"+term;
+    }
+    return "#"+term;
+}
+
+function makeLazyTermLink(config, term) {
+    var link = document.createElement("a");
+    link.href = getLazyTermHref(config, term);
+    link.textContent = "#"+term;
+    return link;
+}
+
+function makeLazyPopupItem(config, ob) {
+    var item = document.createElement("li");
+    if (typeof ob === "string") {
+        if (ob !== ":__") {
+            item.textContent = ob;
+        }
+    } else if (ob["@id"] === undefined) {
+        item.textContent = ob["@value"];
+    } else if (ob["@id"].indexOf(config.base+"#") === 0) {
+        item.appendChild(makeLazyTermLink(
+            config, ob["@id"].slice(config.base.length+1)));
+    } else {
+        var link = document.createElement("a");
+        link.href = ob["@id"];
+        link.textContent = ob["@id"];
+        item.appendChild(link);
+    }
+    return item;
+}
+
+function fillLazyPopup(term, prop, body) {
+    var config = document.querySelector("table.terms").dataset;
+    var items;
+
+    if (prop === "built-in:narrower") {
+        items = fetchPopupSource(config.desise).then(function(desise) {
+            var narrower = desise.terms[term].narrower || [];
+            return narrower.slice().sort().map(function(child) {
+                var item = document.createElement("li");
+                if (desise.terms[child]) {
+                    item.appendChild(makeLazyTermLink(config, child));
+                } else {
+                    item.textContent = child;
+                }
+                return item;
+            });
+        });
+    } else {
+        items = fetchPopupSource(config.jsonld, "@id").then(function(index) {
+            var obs = index[config.base+"#"+term][prop];
+            return [].concat(obs).map(function(ob) {
+                return makeLazyPopupItem(config, ob);
+            });
+        });
+    }
+
+    items.then(function(items) {
+        var list = document.createElement("ul");
+        list.className = "compactlist";
+        items.forEach(function(item) {
+            list.appendChild(item);
+        });
+        body.replaceChildren(list);
+    }).catch(function(error) {
+        body.textContent = "Could not load: "+error;
+    });
+}
+
+// replaces a span.lazy-popup with the markup of a normal, opened popup
+// and has that filled.
+function openLazyPopup(head) {
+    var popup = document.createElement("label");
+    popup.className = "popup";
+    var control = document.createElement("input");
+    control.type = "checkbox";
+    control.className = "popup-control";
+    control.checked = true;
+    var popupHead = document.createElement("span");
+    popupHead.className = "popup-head proplabel";
+    popupHead.textContent = head.textContent;
+    var body = document.createElement("div");
+    body.className = "popup-body";
+    body.textContent = "Loading...";
+    popup.append(control, popupHead, body);
+    head.replaceWith(popup);
+
+    fillLazyPopup(popup.closest("tr").id, head.dataset.prop, body);
+}
+
+document.addEventListener("click", function(event) {
+    var head = event.target.closest("span.lazy-popup");
+    if (head) {
+        openLazyPopup(head);
+    }
+});
+"""
+
 CSS_STYLE = """
 html {
     font-family: sans;
@@ -266,6 +455,46 @@ td a:hover {
 """
 
 
+def get_asset_name(extension, content):
+    """returns the file name of a shared HTML asset with content.
+
+    The name contains a hash of content, so files with a given name
+    never change and can be cached by browsers indefinitely.
+    """
+    return "vocab-{}.{}".format(
+        hashlib.sha256(content.encode("utf-8")).hexdigest()[:16],
+        extension)
+
+
+# the static files shared by all HTML pages, as a mapping of extensions
+# to (file name, content) pairs.  write_html_assets puts them into the
+# root of the output hierarchy.
+HTML_ASSETS = {
+    extension: (get_asset_name(extension, content), content)
+    for extension, content in [
+        ("css", CSS_STYLE),
+        ("js", JAVASCRIPT+LAZY_POPUP_SCRIPT)]}
+
+# javascript for the index pages of sharded HTML (see
+# Vocabulary.write_sharded_html), redirecting term fragments to the page
+# documenting the term.  The shard key computation must match
+# get_shard_key.  This is included verbatim in the HTML, so it must not
+# contain HTML metacharacters.
+SHARD_REDIRECT_SCRIPT_TEMPLATE = """
+(function() {{
+    var shards = {shard_map};
+    var term = decodeURIComponent(window.location.hash.slice(1));
+    if (term) {{
+        var key = term.charAt(0).toLowerCase();
+        var page = shards[/^[a-z]$/.test(key)? key: "other"];
+        if (page) {{
+            window.location.replace(page+window.location.hash);
+        }}
+    }}
+}})();
+"""
+
+
 DEFAULT_LICENSE_HTML = """This vocabulary is made available under
 <a href="">CC-0</a> by the <a
 href="https://wiki.ivoa.net/twiki/bin/view/IVOA/IvoaSemantics">IVOA
@@ -303,6 +532,53 @@ def work_dir(dir_name, clear_first=False):
         os.chdir(owd)
 
 
+def have_same_content(name1, name2):
+    """returns True if the files name1 and name2 have the same bytes.
+    """
+    if os.path.getsize(name1)!=os.path.getsize(name2):
+        return False
+
+    with open(name1, "rb") as f1, open(name2, "rb") as f2:
+        while True:
+            chunk = f1.read(1<<20)
+            if chunk!=f2.read(1<<20):
+                return False
+            if not chunk:
+                return True
+
+
+@contextlib.contextmanager
+def open_if_changed(dest_name, binary=False):
+    """a context manager for writing dest_name unless it already has the
+    content written.
+
+    This yields a file opened for writing, in binary mode if binary is
+    True and for utf-8 text otherwise.  What is written goes to a
+    temporary file, which, when the controlled block is left without an
+    exception, replaces dest_name if the contents differ and is removed
+    otherwise.  Unchanged files thus keep their modification dates, so
+    syncing the output only transfers what has actually changed, and
+    nobody ever sees half-written files.
+    """
+    tmp_name = dest_name+".tmp"
+    try:
+        if binary:
+            f = open(tmp_name, "wb")
+        else:
+            f = open(tmp_name, "w", encoding="utf-8")
+        with f:
+            yield f
+
+        if (os.path.exists(dest_name)
+                and have_same_content(tmp_name, dest_name)):
+            os.unlink(tmp_name)
+        else:
+            os.replace(tmp_name, dest_name)
+    finally:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+
+
 def is_URI(s):
     """returns True if we believe s is a URI.
 
@@ -311,6 +587,20 @@ def is_URI(s):
     return bool(re.match("[a-zA-Z]+://|#", s))
 
 
+def escape_xml(s, quote=False):
+    """returns s with XML metacharacters escaped.
+
+    With quote=True, the result can be used in double-quoted attribute
+    values, too.  CRs are always escaped, as XML parsers would otherwise
+    normalise them away.
+    """
+    s = s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;"
+        ).replace("\r", "&#13;")
+    if quote:
+        s = s.replace('"', "&quot;")
+    return s
+
+
 def append_with_sep(l, item, sep):
     """appends item to l, preceding it with sep if non-empty.
 
@@ -340,36 +630,95 @@ def pick_exactly_one(iter, errmsg, default=None):
             errmsg, len(res)))
 
 
-def _expand_transitively(rn, cur_term, to_process):
-    """helps close_transitively.
+def iter_strongly_connected(graph):
+    """iterates over the strongly connected components of graph.
+
+    graph is a dict mapping nodes to lists of their successors.  The
+    components are returned as lists of nodes, where components come
+    before all components that they can be reached from.
 
-    See the explanation of the strategy there.
+    This is Tarjan's algorithm, with the recursion unrolled so deep
+    graphs do not hit python's recursion limit.  It runs in time linear
+    in the size of the graph.
     """
-    for narrower_term in rn.get(cur_term, []):
-        if narrower_term in to_process:
-            _expand_transitively(rn, narrower_term, to_process)
-            to_process.remove(narrower_term)
-        rn[cur_term].extend(rn.get(narrower_term, []))
+    index, lowlink, on_stack, stack = {}, {}, set(), []
+
+    for root in graph:
+        if root in index:
+            continue
+
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    break
+                elif successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+
+            else:
+                # all successors of node are done
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node]==index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        component.append(member)
+                        if member==node:
+                            break
+                    yield component
 
 
 def close_transitively(raw_narrower):
     """closes raw_narrower transitively.
 
     raw_narrower is a dict of lists; for every item i in a value list,
-    that list is expanded by raw_narrower[i].
+    that list is expanded by raw_narrower[i].  Each item only occurs
+    once in the expanded lists; direct children come first, followed by
+    the expansions of the children in order.
 
-    This helps add_desise_narrowser in the case of non-SKOS vocabularies;
-    it will not do anything sensible if d doesn't describe a tree.  In
-    particular, it will not detect cycles and may go down in flames if
-    there are any.
+    This helps add_desise_narrowser in the case of non-SKOS vocabularies,
+    where the wider relationship must not have cycles.  If there are any
+    nevertheless, a ReportableError is raised.
     """
-    # our strategy: Pick a term to process and expand it and the subtree
-    # below it post-order, removing anything visited from from our to-do list.
-    # Repeat until we're done.
-    to_process = set(raw_narrower)
+    # strongly connected components come leaves first, so the expansions
+    # of all children are available when a term is processed, and we can
+    # simply re-use them.
+    cycles = []
+    for component in iter_strongly_connected(raw_narrower):
+        term = component[0]
+        children = raw_narrower.get(term)
+        if len(component)>1 or (children and term in children):
+            cycles.append(component)
+        if cycles or not children:
+            # if there are cycles, we only continue to find all of them
+            continue
 
-    while to_process:
-        _expand_transitively(raw_narrower, to_process.pop(), to_process)
+        expanded, seen = list(children), set(children)
+        for child in children:
+            for descendant in raw_narrower.get(child, ()):
+                if descendant not in seen:
+                    seen.add(descendant)
+                    expanded.append(descendant)
+        raw_narrower[term] = expanded
+
+    if cycles:
+        raise ReportableError("The wider relationship has cycles"
+            " involving the terms {}".format(
+                "; ".join(", ".join(sorted(c)) for c in cycles)))
 
 
 def invert_wider(voc):
@@ -394,28 +743,66 @@ def invert_wider(voc):
 ############ tiny DOM start (snarfed and simplified from DaCHS stanxml)
 # (used to write HTML)
 
+def _escape_html_text(tx):
+        """returns tx escaped for use in element content.
+
+        This escapes just like ElementTree.
+        """
+        if "&" in tx:
+                tx = tx.replace("&", "&amp;")
+        if "<" in tx:
+                tx = tx.replace("<", "&lt;")
+        if ">" in tx:
+                tx = tx.replace(">", "&gt;")
+        return tx
+
+
+def _escape_html_attr(val):
+        """returns val escaped for use in a double-quoted attribute.
+
+        This escapes just like ElementTree.
+        """
+        val = _escape_html_text(val)
+        for char, entity in [('"', "&quot;"), ("\r", "&#13;"),
+                        ("\n", "&#10;"), ("\t", "&#09;")]:
+                if char in val:
+                        val = val.replace(char, entity)
+        return val
+
+
+class _Streamed(object):
+        """A sequence of children only generated when the document is written.
+
+        make_children is a function returning an iterable of _Elements.
+        When an _Element containing a _Streamed is written, these are
+        serialised and written one at a time, which keeps, e.g., huge
+        tables out of memory.
+        """
+        def __init__(self, make_children):
+                self.make_children = make_children
+
+
 class _Element(object):
         """An element within a DOM.
 
-        Essentially, this is a simple way to build elementtrees.  You can
-        reach the embedded elementtree Element as node.
+        Essentially, this is a simple way to build (X)HTML documents;
+        they are serialised like ElementTree would, but without building
+        ElementTree nodes first.
 
         Add elements, sequences, etc, using indexation, attributes using function
         calls; names with dashes are written with underscores, python
         reserved words have a trailing underscore.
         """
-        _generator_t = type((x for x in ()))
-
         def __init__(self, name):
-                self.node = etree.Element(name)
+                self.name = name
+                self.attrs = {}
+                self.children = []
 
         def add_text(self, tx):
                 """appends tx either the end of the current content.
                 """
-                if len(self.node):
-                        self.node[-1].tail = (self.node[-1].tail or "")+tx
-                else:
-                        self.node.text = (self.node.text or "")+tx
+                if tx:
+                        self.children.append(tx)
 
         def __getitem__(self, child):
                 if child is None:
@@ -427,11 +814,8 @@ class _Element(object):
                 elif isinstance(child, (int, float)):
                         self.add_text(str(child))
 
-                elif isinstance(child, _Element):
-                        self.node.append(child.node)
-
-                elif isinstance(child, etree.Element):
-                        self.node.append(child)
+                elif isinstance(child, (_Element, _Streamed, etree.Element)):
+                        self.children.append(child)
 
                 elif hasattr(child, "__iter__"):
                         for c in child:
@@ -439,7 +823,7 @@ class _Element(object):
 
                 else:
                         raise Exception("%s element %s cannot be added to %s node"%(
-                                type(child), repr(child), self.node.tag))
+                                type(child), repr(child), self.name))
                 return self
 
         def __call__(self, **kwargs):
@@ -447,12 +831,68 @@ class _Element(object):
                         if k.endswith("_"):
                                 k = k[:-1]
                         k = k.replace("_", "-")
-                        self.node.attrib[k] = v
+                        self.attrs[k] = v
                 return self
 
+        @staticmethod
+        def _serialise_child(child, parts, dest_file):
+                """appends the serialisation of a (non-_Streamed) child to
+                parts.
+                """
+                if isinstance(child, str):
+                        parts.append(_escape_html_text(child))
+                elif isinstance(child, _Element):
+                        child._serialise(parts, dest_file)
+                else:
+                        parts.append(etree.tostring(child, encoding="unicode"))
+
+        def _serialise(self, parts, dest_file=None):
+                """appends the serialisation of this element to the list parts.
+
+                If dest_file is given, the children of _Streamed children
+                are written to it as they are generated (after what has been
+                collected in parts so far); otherwise, they are serialised
+                into parts, too.
+                """
+                start_tag = "<"+self.name+"".join(
+                        ' {}="{}"'.format(k, _escape_html_attr(v))
+                        for k, v in self.attrs.items())
+                if not self.children:
+                        parts.append(start_tag+" />")
+                        return
+                parts.append(start_tag+">")
+
+                for child in self.children:
+                        if isinstance(child, _Streamed):
+                                for c in child.make_children():
+                                        self._serialise_child(c, parts, None)
+                                        if dest_file is not None:
+                                                dest_file.write("".join(parts))
+                                                parts.clear()
+                        else:
+                                self._serialise_child(child, parts, dest_file)
+
+                parts.append("</"+self.name+">")
+
+        def render(self):
+                """returns the serialisation of this element as a string.
+                """
+                parts = []
+                self._serialise(parts)
+                return "".join(parts)
+
+        def write(self, dest_file):
+                """writes the serialisation of this element to the text file
+                dest_file.
+
+                _Streamed children are generated and written one by one.
+                """
+                parts = []
+                self._serialise(parts, dest_file)
+                dest_file.write("".join(parts))
+
         def dump(self, encoding="utf-8", dest_file=sys.stdout.buffer):
-            etree.ElementTree(self.node).write(
-                dest_file, encoding=encoding)
+                dest_file.write(self.render().encode(encoding))
 
 
 class _T(object):
@@ -471,6 +911,19 @@ T = _T()
 
 ############ The term class and associated code
 
+def get_shard_key(term):
+    """returns the key of the HTML page term is documented on when a
+    vocabulary's HTML is sharded.
+
+    That is the term's first letter if it is an ASCII letter, and "other"
+    otherwise.
+    """
+    first = term[:1].lower()
+    if first and first in "abcdefghijklmnopqrstuvwxyz":
+        return first
+    return "other"
+
+
 def make_ttl_literal(ob):
     """returns a turtle literal for an object.
 
@@ -498,6 +951,207 @@ def make_ttl_literal(ob):
             return '"{}"'.format(ob.replace('"', '\\"'))
 
 
+def expand_curie(curie):
+    """returns the full URI for a CURIE with one of our NAMESPACES.
+    """
+    prefix, local = curie.split(":", 1)
+    try:
+        return NAMESPACES[prefix]+local
+    except KeyError:
+        raise ReportableError(f"Unknown namespace prefix in {curie}")
+
+
+def make_rdf_object(ob, baseuri):
+    """returns a pair of (kind, value) for the RDF object that
+    make_ttl_literal(ob) denotes in a turtle document with baseuri.
+
+    kind is uri (value is then a full URI), boolean (value is true or
+    false), or literal (value is the literal's text).  Additionally,
+    the native serialisers understand the kinds literal-en (an English
+    literal) and node (a blank node; value is then a list of properties
+    as in Term.get_rdf_description).
+
+    Keep this in sync with make_ttl_literal.
+    """
+    if isinstance(ob, bool):
+        return "boolean", "true" if ob else "false"
+
+    if not isinstance(ob, str):
+        raise ValueError(f"Cannot make a literal from: {ob}")
+
+    if is_URI(ob):
+        if ob.startswith("#"):
+            return "uri", baseuri+ob
+        return "uri", ob
+
+    elif re.match(r"\w+:\w+", ob):
+        return "uri", expand_curie(ob)
+
+    else:
+        return "literal", ob
+
+
+def _format_rdfx_properties(properties, indent):
+    """returns a list of RDF/XML lines for properties.
+
+    properties is a list of (predicate, (kind, value)) pairs as
+    described in make_rdf_object.
+    """
+    lines = []
+    for predicate, (kind, value) in properties:
+        if kind=="uri":
+            lines.append('{}<{} rdf:resource="{}"/>'.format(
+                indent, predicate, escape_xml(value, quote=True)))
+
+        elif kind=="node":
+            lines.append(f'{indent}<{predicate} rdf:parseType="Resource">')
+            lines.extend(_format_rdfx_properties(value, indent+"  "))
+            lines.append(f'{indent}</{predicate}>')
+
+        else:
+            attrs = ""
+            if kind=="literal-en":
+                attrs = ' xml:lang="en"'
+            elif kind=="boolean":
+                attrs = ' rdf:datatype="{}"'.format(
+                    NAMESPACES["xsd"]+"boolean")
+            lines.append("{}<{}{}>{}</{}>".format(
+                indent,
+                predicate,
+                attrs,
+                escape_xml(value),
+                predicate))
+
+    return lines
+
+
+def format_rdfx_description(uri, rdf_class, properties):
+    """returns an RDF/XML node element for the resource uri.
+
+    rdf_class is a CURIE for the resource's type, properties a list as
+    described in make_rdf_object.
+    """
+    about = escape_xml(uri, quote=True)
+    if not properties:
+        return f'  <{rdf_class} rdf:about="{about}"/>\n'
+
+    return "\n".join(
+        [f'  <{rdf_class} rdf:about="{about}">']
+        +_format_rdfx_properties(properties, "    ")
+        +[f'  </{rdf_class}>', ""])
+
+
+def _make_jsonld_properties(properties):
+    """returns a dictionary of compact JSON-LD for properties.
+
+    properties is a list of (predicate, (kind, value)) pairs as described
+    in make_rdf_object.  Predicates with more than one object get lists.
+    """
+    res = {}
+    for predicate, (kind, value) in properties:
+        if kind=="uri":
+            value = {"@id": value}
+        elif kind=="node":
+            value = _make_jsonld_properties(value)
+        elif kind=="literal-en":
+            value = {"@value": value, "@language": "en"}
+        elif kind=="boolean":
+            value = {"@value": value, "@type": "xsd:boolean"}
+
+        if predicate in res:
+            if not isinstance(res[predicate], list):
+                res[predicate] = [res[predicate]]
+            res[predicate].append(value)
+        else:
+            res[predicate] = value
+
+    return res
+
+
+def format_jsonld_node(uri, rdf_class, properties):
+    """returns a compact JSON-LD node object for the resource uri
+    as a string.
+
+    The arguments are as for format_rdfx_description; the result is
+    to be used within a document having JSONLD_HEADER.
+    """
+    node = {"@id": uri, "@type": rdf_class}
+    node.update(_make_jsonld_properties(properties))
+    return json.dumps(node)
+
+
+# tokens in the relations column of our CSV: parentheses, whitespace,
+# and everything else.
+_RELATION_TOKEN_RE = re.compile(r"[()]|\s+|[^()\s]+")
+
+
+@functools.lru_cache(maxsize=2**14)
+def parse_relation_column(relations):
+    """returns a tuple of (predicate, object) pairs for our relationship
+    input format.
+
+    That's a space-separated sequence of either predicate names or
+    predicate-name(object-spec) specifications, where object-spec
+    has balanced parentheses and is taken verbatim (except for leading
+    and trailing whitespace).  Objects that are plain terms are turned
+    into references into the current vocabulary (#term); anything else
+    is interpreted later by make_ttl_literal and friends.
+
+    This is a single pass over the input, and each token is only looked
+    at once, so the run time is linear in the length of relations.  Since
+    many terms have identical relations, results are cached.
+
+    If our grammar gets any more complex, we should use a proper
+    parser generator.
+    """
+    result, predicate, depth, arg_start = [], None, 0, None
+
+    for mat in _RELATION_TOKEN_RE.finditer(relations):
+        token = mat.group()
+
+        if depth:
+            # we are parsing an argument; just watch the parentheses
+            if token=="(":
+                depth += 1
+            elif token==")":
+                depth -= 1
+                if not depth:
+                    obj = relations[arg_start:mat.start()].strip()
+                    if not obj:
+                        raise ValueError("Empty argument at {}".format(
+                            arg_start))
+                    # a little hack: URI-fy plain objects by making them
+                    # part of the current vocabulary
+                    if TERM_RE.match(obj):
+                        obj = "#"+obj
+                    result.append((predicate, obj))
+                    predicate = None
+
+        elif token=="(":
+            if predicate is None:
+                raise ValueError("Unexpected ( at {}".format(mat.start()))
+            depth, arg_start = 1, mat.end()
+
+        elif token==")":
+            raise ValueError("Unexpected ) at {}".format(mat.start()))
+
+        elif not token.isspace():
+            if predicate is not None:
+                # the previous predicate has no object
+                result.append((predicate, None))
+            if not FULL_TERM_RE.match(token):
+                raise ValueError("Invalid predicate at {}: {}".format(
+                    mat.start(), token))
+            predicate = token
+
+    if depth:
+        raise ValueError("Unbalanced ( at {}".format(arg_start-1))
+    if predicate is not None:
+        result.append((predicate, None))
+
+    return tuple(result)
+
+
 class Term(object):
     """A term in our vocabulary.
 
@@ -505,9 +1159,18 @@ class Term(object):
     and the items from the CSV as per Appendix A, except that
     parent terms are already resolved by the CSV parser.
 
-    self.relations is a set of pairs of (predicate, object),
-    where None in object is a blank node.
+    Relations are kept in a dictionary mapping predicates to the
+    tuple of their objects in the order they were added, where None in
+    object is a blank node.  Use get_objects_for and has_relation to
+    query them; self.relations is a list of (predicate, object) pairs for
+    when you need all of them.
+
+    Since we may have many terms in memory, these are slotted, and
+    predicates and URI objects are interned, which means that, e.g., the
+    parent URI is shared between all children.
     """
+    __slots__ = ("vocabulary", "term", "label", "description", "_relations")
+
     def __init__(self,
             vocabulary,
             term,
@@ -516,12 +1179,14 @@ class Term(object):
             parent=None,
             more_relations=None):
 
-        if not re.match(TERM_PATTERN+"$", term):
+        if not TERM_RE.match(term):
             raise ReportableError("Term fragment {} does not match IVOA"
                 " constraints.".format(term))
 
-        self.relations = set([])
-        self.vocabulary = weakref.proxy(vocabulary)
+        self._relations = {}
+        # this creates a reference cycle; that is fine, as vocabularies
+        # are long-lived anyway, and weak proxies cost extra memory
+        self.vocabulary = vocabulary
         self.term, self.label = term, label
         self.description = description
         if self.vocabulary.draft:
@@ -545,12 +1210,16 @@ class Term(object):
 
         This does some additional validation on what predicate is
         and thus should always be used in preference to directly
-        appending to relations.
+        adding to our relations.
         """
         if not predicate in KNOWN_PREDICATES:
             raise ReportableError("Unknown predicate in ({}, {}, {})"
                 .format(self.term, predicate, object))
-        self.relations.add((predicate, object))
+        objects = self._relations.get(predicate, ())
+        if object not in objects:
+            if object is not None and is_URI(object):
+                object = sys.intern(object)
+            self._relations[sys.intern(predicate)] = objects+(object,)
 
     def _set_parent_term(self, parent_term):
         """adds a triple declaring parent_term as "wider".
@@ -570,91 +1239,35 @@ class Term(object):
             self._add_relation(
                 self.vocabulary.wider_predicate, parent_term)
 
-    @staticmethod
-    def _iter_relationship_literals(relations):
-        """yields pairs of (predicate, object) for our relationship
-        input format.
-
-        That's a space-separated sequence of either predicate names or
-        predicate-name(object-spec) specifications, where object-spec
-        has balanced parentheses.
-
-        The actual interpretation of object-spec happens in _parse_relations
-        and by is_URI.  This should probably be improved to be less
-        ad-hoc.
-
-        And if our grammar gets any more complex, we should use a proper
-        parser generator.
-        """
-        predicate, token_stack = None, None
-        for mat in re.finditer(r"\(|\)|[^()\s]+", relations):
-            token = mat.group(0).strip()
-
-            if predicate is None:
-                if not re.match(FULL_TERM_PATTERN+"$", token):
-                    raise ValueError("Invalid predicate at {}: {}".format(
-                            mat.start(), token))
-                predicate = token
-
-            else:
-                # we have a predicate...
-                if token_stack is None:
-                    # ...and are not parsing an argument
-                    if token=='(':
-                        token_stack = []
-                    elif token==')':
-                        raise ValueError("Unexpected ) at {}".format(
-                            mat.start()))
-                    else:
-                        # current predicate has no object
-                        yield predicate, None
-
-                        if not re.match(FULL_TERM_PATTERN+"$", token):
-                            raise ValueError(
-                                "Invalid predicate at {}: {}"
-                                    .format(mat.start(), token))
-                        predicate = token
-
-                else:
-                    # ...we are parsing argument
-                    if token=='(':
-                        token_stack.append(token)
-                    elif token==')':
-                        arg = token_stack.pop()+')'
-                        if token_stack:
-                            token_stack[-1] += arg
-                        else:
-                            # argument complete, reset parser
-                            yield predicate, arg[:-1]
-                            predicate, token_stack = None, None
-                    else:
-                        # don't discard whitespace here
-                        token_stack.append(mat.group())
-
-        if predicate:
-            # yield a singleton if you don't have yet
-            yield predicate, None
-
     def _parse_relations(self, relations):
         """adds relations passed in through the last column of our CSV.
 
-        This parses {predicate[(object)]}.
+        This parses {predicate[(object)]}; see parse_relation_column.
         """
-        for predicate, obj in self._iter_relationship_literals(relations):
-            # a little hack: URI-fy plain objects by making them part of
-            # the current vocabulary
-            if obj and re.match(TERM_PATTERN+"$", obj):
-                obj = "#"+obj
-
+        for predicate, obj in parse_relation_column(relations):
             self._add_relation(predicate, obj)
 
+    @property
+    def relations(self):
+        """a list of (predicate, object) pairs for all relations of
+        this term.
+        """
+        return [(predicate, object)
+            for predicate, objects in self._relations.items()
+            for object in objects]
+
     def get_objects_for(self, predicate):
-        """yields term names for which (predicate term) is in
-        relationships.
+        """returns a sequence of the term names for which (predicate term)
+        is in relationships.
+
+        Do not modify what is returned.
         """
-        for pred, term in self.relations:
-            if pred==predicate:
-                yield term
+        return self._relations.get(predicate, ())
+
+    def has_relation(self, predicate, object=None):
+        """returns True if (predicate object) is in relationships.
+        """
+        return object in self._relations.get(predicate, ())
 
     def as_ttl(self):
         """returns a turtle representation of this term in a string.
@@ -681,6 +1294,27 @@ class Term(object):
 
         return ";\n  ".join(template).format(**fillers)+"."
 
+    def get_rdf_description(self):
+        """returns a triple (uri, class, properties) describing this term.
+
+        properties is a list of (predicate, (kind, value)) pairs, where
+        kind and value are as returned by make_rdf_object.  This must
+        describe the same triples as as_ttl.
+        """
+        baseuri = self.vocabulary.baseuri
+        properties = [
+            (self.vocabulary.label_property,
+                make_rdf_object(self.label, baseuri)),
+            (self.vocabulary.description_property,
+                make_rdf_object(self.description or "N/D", baseuri))]
+
+        for predicate, object in self.relations:
+            if object is None:
+                object = ":__"
+            properties.append((predicate, make_rdf_object(object, baseuri)))
+
+        return self.get_url(), self.vocabulary.term_class, properties
+
     def _format_term_as_html(self, term):
         """returns HTML for a term.
 
@@ -691,14 +1325,15 @@ class Term(object):
         """
         if term is None:
             return term
-        if is_URI(term):
-            return T.a(href=term)[term]
 
         if term[0]=='#':
-            term = term[1:]
+            return T.a(href=self.vocabulary.get_term_href(term[1:]))[term]
+
+        if is_URI(term):
+            return T.a(href=term)[term]
 
         if term in self.vocabulary.terms:
-            return T.a(href="#"+term)["#"+term]
+            return T.a(href=self.vocabulary.get_term_href(term))["#"+term]
         else:
             return term
 
@@ -726,7 +1361,13 @@ class Term(object):
             if objs:
                 # we have the property...
                 non_nulls = [o for o in objs if o is not None]
-                if non_nulls:
+                if non_nulls and self.vocabulary.lazypopups:
+                    # ...and the property has non-blank objects that
+                    # LAZY_POPUP_SCRIPT pulls in when the popup is opened
+                    yield T.span(class_="proplabel lazy-popup",
+                        data_prop=prop)["{} ({})".format(label, len(objs))]
+
+                elif non_nulls:
                     # ...and the property has non-blank objects
                     yield T.label(class_="popup")[
                         T.input(type="checkbox", class_="popup-control"),
@@ -748,8 +1389,8 @@ class Term(object):
     def as_html(self):
         """returns elementtree for an HTML table line for this term.
         """
-        preliminary = ("ivoasem:preliminary", None) in self.relations
-        deprecated = ("ivoasem:deprecated", None) in self.relations
+        preliminary = self.has_relation("ivoasem:preliminary")
+        deprecated = self.has_relation("ivoasem:deprecated")
 
         formatted_relations = []
         for rel in self._format_more_relations():
@@ -820,6 +1461,14 @@ class Vocabulary(object):
       verbatim in HTML.  Again, only use for externally managed vocabularies.
     * topconcepts: space-separated identifiers that are declared as SKOS
       top concepts.
+    * shardthreshold: if there are more terms than this, the HTML is
+      split into an index page and one page per leading letter of the
+      terms (see write_html).
+    * lazypopups: true if there's a key lazypopups in vocabs.conf.  The
+      relation popups in the HTML then are only filled from the desise
+      and JSON-LD files when they are opened.
+    * artefacts: the names of the files written through open_artefact
+      in the current directory.
 
     To derive a subclass, you need to define:
 
@@ -842,6 +1491,8 @@ class Vocabulary(object):
 
         self.draft = bool(meta.pop("draft", False))
         self.hidden = bool(meta.pop("hidden", False))
+        self.lazypopups = bool(meta.pop("lazypopups", False))
+        self.artefacts = set()
 
         path = meta.get("path", meta["name"])
         defaults = {
@@ -852,6 +1503,7 @@ class Vocabulary(object):
             "licenseuri":
                 "http://creativecommons.org/publicdomain/zero/1.0/",
             "topconcepts": "",
+            "shardthreshold": HTML_SHARD_THRESHOLD,
         }
         defaults.update(meta)
         meta = defaults
@@ -859,6 +1511,13 @@ class Vocabulary(object):
         for key, value in meta.items():
             setattr(self, key, value)
 
+        try:
+            self.shardthreshold = int(self.shardthreshold)
+        except ValueError:
+            raise ReportableError("Vocabulary definition for {}:"
+                " shardthreshold must be an integer, not {!r}.".format(
+                    self.name, self.shardthreshold))
+
         self._load_terms()
 
         self.inverted_wider = invert_wider(self)
@@ -904,63 +1563,165 @@ class Vocabulary(object):
             "flavour": self.flavour,
             "licenseuri": self.licenseuri}
 
+    def iter_turtle(self):
+        """iterates over the parts of a turtle representation of the
+        vocabulary.
+
+        This yields the header and then one chunk per term, so the
+        large vocabularies do not have to be kept in memory as a whole.
+        """
+        meta_items = dict((k, make_ttl_literal(v))
+            for k, v in self.get_meta_dict().items())
+        meta_items["creators"] = ",\n    ".join(
+                '[ foaf:name {} ]'.format(make_ttl_literal(n.strip()))
+            for n in self.authors.split(";"))
+        yield TTL_HEADER_TEMPLATE.format(**meta_items)
+
+        for top_concept in self.topconcepts.split():
+            yield f"<> skos:hasTopConcept <#{top_concept}>.\n"
+
+        for _, term in sorted(self.terms.items()):
+            yield term.as_ttl()+"\n\n"
+
+    def iter_rdf_descriptions(self):
+        """iterates over (uri, class, properties) triples describing
+        the vocabulary and its terms.
+
+        See Term.get_rdf_description for what these are.  This is
+        what the native serialisers work from; it must describe the
+        same triples as iter_turtle (and hence TTL_HEADER_TEMPLATE).
+        """
+        meta = self.get_meta_dict()
+        baseuri = meta["baseuri"]
+
+        properties = [
+            ("dc:created", make_rdf_object(meta["timestamp"], baseuri))]
+        for name in meta["authors"].split(";"):
+            properties.append(("dc:creator", ("node", [
+                ("foaf:name", make_rdf_object(name.strip(), baseuri))])))
+        properties.extend([
+            ("dc:license", make_rdf_object(meta["licenseuri"], baseuri)),
+            ("rdfs:label", ("literal-en", meta["title"])),
+            ("dc:title", ("literal-en", meta["title"])),
+            ("dc:description", make_rdf_object(meta["description"], baseuri)),
+            ("ivoasem:vocflavour", make_rdf_object(meta["flavour"], baseuri))])
+        for top_concept in self.topconcepts.split():
+            properties.append(
+                ("skos:hasTopConcept", ("uri", baseuri+"#"+top_concept)))
+        yield baseuri, "owl:Ontology", properties
+
+        for annotation_property in [
+                "dc:created", "dc:creator", "dc:title", "dc:description"]:
+            yield (expand_curie(annotation_property),
+                "owl:AnnotationProperty", [])
+
+        for _, term in sorted(self.terms.items()):
+            yield term.get_rdf_description()
+
+    def open_artefact(self, name, binary=False):
+        """returns a context manager for writing the file name in the
+        current directory (see open_if_changed).
+
+        All writers writing into the vocabulary version directory must
+        use this, as write_representation removes all files not written
+        through it.
+        """
+        self.artefacts.add(name)
+        return open_if_changed(name, binary)
+
     def write_turtle(self):
         """writes a turtle representation of the vocabulary to
         the current directory as <name>.ttl.
         """
-        with open(self.name+".ttl", "w", encoding="utf-8") as f:
-            meta_items = dict((k, make_ttl_literal(v))
-                for k, v in self.get_meta_dict().items())
-            meta_items["creators"] = ",\n    ".join(
-                    '[ foaf:name {} ]'.format(make_ttl_literal(n.strip()))
-                for n in self.authors.split(";"))
-            f.write(TTL_HEADER_TEMPLATE.format(**meta_items))
-
-            for top_concept in self.topconcepts.split():
-                f.write(f"<> skos:hasTopConcept <#{top_concept}>.\n")
-
-            for _, term in sorted(self.terms.items()):
-                f.write(term.as_ttl())
-                f.write("\n\n")
+        with self.open_artefact(self.name+".ttl") as f:
+            for part in self.iter_turtle():
+                f.write(part)
 
     def write_jsonld(self):
         """writes a json-ld representation of the current vocabulary
-        to current directory as <name>.
+        to current directory as <name>.json.
 
-        rdflib's JSON-LD serializer does not support base URI.
+        Like write_rdfx, this works from iter_rdf_descriptions, writing
+        one node object per line, compacted against NAMESPACES.
         """
-        triples = rdflib.Graph()
-        with open(self.name+".ttl", "r", encoding="utf-8") as f:
-            triples.parse(file=f, format="turtle")
-        with open(self.name+".json", "wb") as f:
-            triples.serialize(f, "json-ld",
-                              context=NAMESPACES)
+        with self.open_artefact(self.name+".json") as f:
+            f.write(JSONLD_HEADER)
+            sep = "    "
+            for uri, rdf_class, properties in self.iter_rdf_descriptions():
+                f.write(sep)
+                f.write(format_jsonld_node(uri, rdf_class, properties))
+                sep = ",\n    "
+            f.write("\n  ]\n}\n")
 
     def write_rdfx(self):
         """writes an RDF/X representation of the current vocabulary
         to current directory as <name>.rdf
 
-        Since we never actually deal with proper RDF triples in here (so
-        far), we create the RDF/X as an export of our turtle code.  Perhaps
-        that's even for the better.
+        This is streamed from iter_rdf_descriptions rather than going
+        through rdflib, whose generic serialiser is slow and memory-hungry
+        for the large vocabularies.
         """
-        triples = rdflib.Graph()
-        with open(self.name+".ttl", "r", encoding="utf-8") as f:
-            triples.parse(file=f, format="turtle")
-        with open(self.name+".rdf", "wb") as f:
-            triples.serialize(f, "xml")
+        with self.open_artefact(self.name+".rdf") as f:
+            f.write(RDFX_HEADER)
+            for uri, rdf_class, properties in self.iter_rdf_descriptions():
+                f.write(format_rdfx_description(uri, rdf_class, properties))
+            f.write("</rdf:RDF>\n")
 
     def write_desise(self):
-        """writes a dead simple semantics json into the current directory
-        as <name>.desise.
+        """writes dead simple semantics json into the current directory.
+
+        This is <name>.desise, indented for human consumption, and
+        <name>.min.desise without whitespace; content negotiation
+        delivers the latter.
         """
-        with open(self.name+".desise", "w", encoding="utf-8") as f:
-            json.dump(to_desise_dict(self), f, indent="  ")
+        with self.open_artefact(self.name+".desise") as pretty_file, \
+            self.open_artefact(self.name+".min.desise") as compact_file:
+            write_desise_files(self, pretty_file, compact_file)
 
-    def get_html_body(self):
+    def is_html_sharded(self):
+        """returns True if the HTML of this vocabulary is split into
+        several pages.
+        """
+        return len(self.terms)>self.shardthreshold
+
+    def get_html_shard_name(self, shard_key):
+        """returns the file name of the HTML page for shard_key.
+
+        See get_shard_key for what shard keys are.
+        """
+        return "{}-{}.html".format(self.name, shard_key)
+
+    def get_term_href(self, term):
+        """returns a link to the documentation of term within the
+        HTML.
+
+        For sharded HTML, that is to the page the term is on.
+        """
+        if self.is_html_sharded():
+            return self.get_html_shard_name(get_shard_key(term))+"#"+term
+        return "#"+term
+
+    def get_html_body(self, terms=None):
         """returns HTML DOM material for the terms in this vocabulary.
+
+        terms, if given, is a sequence of the terms to document;
+        the default is all terms sorted by name.
+
+        The term rows are only generated while the document is written,
+        so they never all are in memory at the same time.
         """
-        return T.table(class_="terms")[
+        if terms is None:
+            terms = [t for _, t in sorted(self.terms.items())]
+
+        table = T.table(class_="terms")
+        if self.lazypopups:
+            table(data_desise=self.name+".min.desise",
+                data_jsonld=self.name+".json",
+                data_base=self.baseuri)
+            if self.is_html_sharded():
+                table(data_shardprefix=self.name+"-")
+
+        return table[
         T.thead[
             T.tr[
                 T.th(title="The formal name of the term as used in URIs"
@@ -976,29 +1737,35 @@ class Vocabulary(object):
             ],
         ],
         T.tbody[
-            [t.as_html() for _, t in sorted(self.terms.items())]
+            _Streamed(lambda: (t.as_html() for t in terms))
         ]]
 
-    def write_html(self):
-        """writes an HTML representation of this vocabulary to the
-        current directory as <name>.html.
+    def get_html_doc(self, content, extra_script=""):
+        """returns an HTML DOM for a page of this vocabulary's HTML with
+        content between the introduction and the footer.
 
-        Override the get_html_body method to change this method's
-        behaviour; what's in here is just the source format-independent
-        material.
+        extra_script, if given, is javascript source code added
+        to the page head.  It must not contain HTML metacharacters.
         """
         # licensehtml is an HTML literal; parse it first so the elements
         # don't get escaped
         license_element = etree.fromstring(
             '<p id="license">'+self.licensehtml+'</p>')
-        doc = T.html(xmlns="http://www.w3.org/1999/xhtml")[
+        # we are in <path>/<timestamp>; the assets are in the root
+        asset_root = "../"*(self.path.count("/")+2)
+        return T.html(xmlns="http://www.w3.org/1999/xhtml")[
         T.head[
             T.title["IVOA Vocabulary: "+self.title],
             T.meta(http_equiv="content-type",
                 content="text/html;charset=utf-8"),
-            T.script(type="text/javascript") [JAVASCRIPT],
-            T.style(type="text/css")[
-                CSS_STYLE],],
+            T.link(rel="stylesheet", type="text/css",
+                href=asset_root+HTML_ASSETS["css"][0]),
+            # the text content keeps the element from being written
+            # as an empty element, which browsers do not understand
+            T.script(type="text/javascript",
+                src=asset_root+HTML_ASSETS["js"][0])["\n"],
+            T.script(type="text/javascript")[extra_script]
+                if extra_script else "",],
         T.body[
             T.h1["IVOA Vocabulary: "+self.title],
             T.div(class_="intro")[
@@ -1010,7 +1777,7 @@ class Vocabulary(object):
                     " terms can still disappear without prior notice."]
                     if self.draft else "",
                 T.p(class_="description")[self.description]],
-                self.get_html_body(),
+                content,
                 T.p(class_="outro")["Alternate formats: ",
                     T.a(href=self.name+".rdf")["RDF/XML"],
                     ", ",
@@ -1023,8 +1790,76 @@ class Vocabulary(object):
                 license_element
        ]]
 
-        with open(self.name+".html", "wb") as f:
-            doc.dump(dest_file=f)
+    def _get_shard_navigation(self, shards):
+        """returns an HTML paragraph linking to all HTML shards.
+
+        shards is a dictionary mapping shard keys to the lists of terms
+        on the respective pages.
+        """
+        links = []
+        for shard_key, terms in shards.items():
+            append_with_sep(links,
+                T.a(href=self.get_html_shard_name(shard_key),
+                    title="{} terms".format(len(terms)))[
+                    shard_key.upper() if len(shard_key)==1 else shard_key],
+                " | ")
+        return T.p(class_="shardnav")[
+            T.a(href=self.name+".html")["Index"], ": ", links]
+
+    def write_sharded_html(self):
+        """writes HTML for a large vocabulary as an index page <name>.html
+        and pages <name>-<shard key>.html.
+
+        The index page redirects term fragments to the page the term is on.
+        """
+        shards = {}
+        for _, term in sorted(self.terms.items()):
+            shards.setdefault(get_shard_key(term.term), []).append(term)
+        shards = dict(sorted(shards.items(),
+            key=lambda item: (len(item[0])>1, item[0])))
+        navigation = self._get_shard_navigation(shards)
+
+        for shard_key, terms in shards.items():
+            with self.open_artefact(
+                    self.get_html_shard_name(shard_key)) as f:
+                self.get_html_doc(
+                    [navigation, self.get_html_body(terms)]).write(f)
+
+        with self.open_artefact(self.name+".html") as f:
+            self.get_html_doc(
+                [T.p["This vocabulary has {} terms.  To keep page sizes"
+                    " manageable, they are documented on the following"
+                    " pages by the first letter of the term:".format(
+                        len(self.terms))],
+                    T.ul(class_="shardlist")[[
+                        T.li[T.a(href=self.get_html_shard_name(shard_key))[
+                            shard_key.upper() if len(shard_key)==1
+                                else shard_key],
+                            " ({} terms)".format(len(terms))]
+                        for shard_key, terms in shards.items()]]],
+                SHARD_REDIRECT_SCRIPT_TEMPLATE.format(
+                    shard_map=json.dumps(dict(
+                        (shard_key, self.get_html_shard_name(shard_key))
+                        for shard_key in shards)))).write(f)
+
+    def write_html(self):
+        """writes an HTML representation of this vocabulary to the
+        current directory as <name>.html.
+
+        If the vocabulary has more than shardthreshold terms, the terms
+        are instead documented on several pages, and <name>.html becomes
+        an index page (see write_sharded_html).
+
+        Override the get_html_body method to change this method's
+        behaviour; what's in here is just the source format-independent
+        material.
+        """
+        if self.is_html_sharded():
+            self.write_sharded_html()
+            return
+
+        with self.open_artefact(self.name+".html") as f:
+            self.get_html_doc(self.get_html_body()).write(f)
 
     def write_meta_inf(self):
         """writes a "short" META.INF for use by the vocabulary TOC generator
@@ -1033,7 +1868,7 @@ class Vocabulary(object):
         if self.hidden:
             return
 
-        with open("META.INF", "w", encoding="utf-8") as f:
+        with open_if_changed("META.INF") as f:
             f.write("Name: {}\n{}\n".format(
             self.title,
             textwrap.fill(
@@ -1053,35 +1888,101 @@ class Vocabulary(object):
         This architecture is necessary because we want to rewrite
         vocabulary URIs before they get mangled by apache's DirectorySlash.
         """
-        with open("htaccess-fragment.txt", "w", encoding="utf-8") as f:
+        with open_if_changed("htaccess-fragment.txt") as f:
             f.write(HT_ACCESS_TEMPLATE.format(
                 timestamp=self.timestamp,
                 path=self.path,
                 name=self.name))
 
+    def write_negotiation(self):
+        """writes negotiation.json, describing what content negotiation
+        should deliver for this vocabulary, to the current directory.
+
+        make-rdf-index.py combines these into lookup tables for web
+        servers.  The file paths are relative to the repository root.
+        """
+        version_dir = "{}/{}/".format(self.path, self.timestamp)
+        with open_if_changed("negotiation.json") as f:
+            json.dump({
+                    "path": self.path,
+                    "timestamp": self.timestamp,
+                    "name": self.name,
+                    "files": dict((media_type,
+                            version_dir+template.format(name=self.name))
+                        for media_type, template in NEGOTIATED_FILES),
+                    "default": NEGOTIATED_FILES[-1][0]},
+                f, indent="  ")
+            f.write("\n")
+
+    def write_precompressed(self):
+        """writes compressed siblings of the artefacts written so far
+        (see write_precompressed).
+        """
+        for name in sorted(self.artefacts):
+            if name.endswith(PRECOMPRESSED_EXTENSIONS):
+                self.artefacts.update(write_precompressed(name))
+
+    def write_manifest(self):
+        """writes the sha256 hashes of the artefacts written so far to
+        MANIFEST_NAME in the current directory.
+
+        The format is that of sha256sum, so sha256sum -c can check a
+        deployed version.  Servers can also derive strong ETags from this
+        (serve-rdf.py does; the apache configuration does not).
+        """
+        lines = []
+        for name in sorted(self.artefacts-{MANIFEST_NAME}):
+            digest = hashlib.sha256()
+            with open(name, "rb") as f:
+                for chunk in iter(lambda: f.read(1<<20), b""):
+                    digest.update(chunk)
+            lines.append("{}  {}\n".format(digest.hexdigest(), name))
+
+        with self.open_artefact(MANIFEST_NAME) as f:
+            f.write("".join(lines))
+
+    def remove_stale_files(self):
+        """removes all files in the current directory that are not
+        artefacts of this build.
+
+        These typically are left over from previous builds, e.g., HTML
+        shards no longer needed or brotli files from when brotli was
+        still installed.
+        """
+        for name in os.listdir("."):
+            if name not in self.artefacts and os.path.isfile(name):
+                os.unlink(name)
+
     def write_representation(self, fs_root):
         """builds the vocabulary's representation below fs_root.
 
-        This puts ttl, html and rdf/x into <fs_root>/<name>/<timestamp>,
-        and it arranges for a content-negotiating .htaccess file and
-        a META.INF for the vocabulary index within <name>/.
+        This puts ttl, html and rdf/x (plus compressed versions of
+        them) into <fs_root>/<name>/<timestamp>,
+        and it arranges for a content-negotiating .htaccess file,
+        a negotiation.json, and a META.INF for the vocabulary index
+        within <name>/.
+
+        Files whose content does not change are not touched (cf.
+        open_if_changed); whatever else is in <timestamp> is removed.
         """
         with work_dir(
                 os.path.join(
                     fs_root,
                     self.path,
-                    self.timestamp),
-                clear_first=True):
-            self.write_turtle()
-            self.write_html()
-            self.write_jsonld()
-            self.write_rdfx()
-            self.write_desise()
+                    self.timestamp)):
+            for writer in [self.write_turtle, self.write_html,
+                    self.write_jsonld, self.write_rdfx, self.write_desise,
+                    self.write_precompressed, self.write_manifest]:
+                with profile_stage(self.name, writer.__name__):
+                    writer()
+            self.remove_stale_files()
 
         with work_dir(
                 os.path.join(fs_root, self.path)):
-            self.write_htaccess()
-            self.write_meta_inf()
+            for writer in [self.write_htaccess, self.write_negotiation,
+                    self.write_meta_inf]:
+                with profile_stage(self.name, writer.__name__):
+                    writer()
 
 
 def comment_ignoring(f):
@@ -1179,13 +2080,22 @@ class SKOSMixin:
 
 class SKOSVocabulary(SKOSMixin, Vocabulary):
     """A SKOS vocabulary read from some sort of input SKOS via skosify.
+
+    Since skosify is slow, the term records extracted from its result
+    are cached in CACHE_DIR (see _get_term_records).
+
+    Alternatively, with skosreader: native in vocabs.conf, the RDF/X
+    is read without skosify (see _read_native_records).
     """
     flavour = "SKOS"
+    skosreader = "skosify"
 
     def _normalise_uri(self, term):
         """returns a local term URI, which is the fragment if uri starts
         with the vocabulary URI, and the full term otherwise.
         """
+        # make sure we do not keep rdflib objects in our terms
+        term = str(term)
         if "#" in term:
             voc_uri, local = term.split('#', 1)
             if voc_uri==self.baseuri:
@@ -1198,11 +2108,19 @@ class SKOSVocabulary(SKOSMixin, Vocabulary):
         """returns (text) terms related to term in voc with the property rel.
 
         rel is a (text) URI of the property, term is a (text) URI.
+        The terms are sorted, as the order of rdflib's triples changes
+        with python's hash randomisation.
         """
-        for _, _, item in voc.triples((term, URIRef(rel), None)):
-            yield self._normalise_uri(item)
+        from rdflib.term import URIRef
+
+        return sorted(self._normalise_uri(item)
+            for _, _, item in voc.triples((term, URIRef(rel), None)))
 
     def _read_one_term(self, voc, term):
+        """returns a record for term in the skosify-processed graph voc.
+
+        Records are tuples of the arguments to Term after the vocabulary.
+        """
         label = pick_exactly_one(self._get_skos_objects_for(voc,
             "http://www.w3.org/2004/02/skos/core#prefLabel",
             term), "preferred label for {}".format(term))
@@ -1240,28 +2158,243 @@ class SKOSVocabulary(SKOSMixin, Vocabulary):
                     voc, prop_url, term):
                 more_relations.append(short_term)
 
-        return Term(self,
+        return (
             self._normalise_uri(term),
             label,
             description,
             parents,
             " ".join(more_relations))
 
-    def _read_terms_source(self):
-        """creates Terms instances from RDF/X SKOS.
+    def _read_skos_records(self):
+        """returns a list of term records (cf. _read_one_term) for the terms
+        from our namespace in our source, as processed by skosify.
         """
-        self.terms = {}
+        try:
+            import skosify
+        except ImportError:
+            raise ReportableError("skosify and/or rdflib python modules"
+                " missing; these are required to process SKOS"
+                " vocabularies.")
 
         voc = skosify.skosify(self.filename)
-        for term in voc.subjects():
-            if not term.startswith(self.baseuri):
+        return [self._read_one_term(voc, term)
+            for term in sorted(set(voc.subjects()))
+            # disregard all terms not belonging to us
+            if term.startswith(self.baseuri)]
+
+    def _get_cache_name(self):
+        """returns the path of the file caching our term records.
+
+        The name contains a hash of everything the records depend on:
+        the source, the base URI, and the versions of skosify, rdflib,
+        and our record format.
+        """
+        from importlib import metadata
+
+        cache_key = hashlib.sha256()
+        with open(self.filename, "rb") as f:
+            cache_key.update(f.read())
+        for package in ["skosify", "rdflib"]:
+            try:
+                version = metadata.version(package)
+            except metadata.PackageNotFoundError:
+                version = "missing"
+            cache_key.update(version.encode("utf-8")+b"\0")
+        cache_key.update(
+            (self.baseuri+"\0"+SKOS_CACHE_VERSION).encode("utf-8"))
+
+        return os.path.join(CACHE_DIR, "{}-{}.json".format(
+            self.name, cache_key.hexdigest()))
+
+    def _get_term_records(self):
+        """returns a list of term records for our source.
+
+        These come from a cache file if we have seen the same source
+        with the same software before; otherwise, they are computed
+        through skosify and cached.  Cache files for previous versions
+        of the source are removed.
+        """
+        cache_name = self._get_cache_name()
+        try:
+            with open(cache_name, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            pass
+
+        records = self._read_skos_records()
+
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            stale_pat = re.compile(
+                re.escape(self.name)+"-[0-9a-f]{64}\\.json$")
+            for stale in os.listdir(CACHE_DIR):
+                if stale_pat.match(stale):
+                    os.unlink(os.path.join(CACHE_DIR, stale))
+
+            # write under a temporary name so concurrent builds never
+            # see partial caches
+            with open(cache_name+".tmp", "w", encoding="utf-8") as f:
+                json.dump(records, f)
+            os.replace(cache_name+".tmp", cache_name)
+        except OSError as ex:
+            sys.stderr.write("Warning: Cannot cache SKOS terms: {}\n".format(
+                ex))
+
+        return records
+
+    def _read_rdfx_descriptions(self):
+        """returns a dictionary mapping the URIs of the top-level resources
+        in our RDF/X source to their properties.
+
+        The properties are dictionaries mapping predicate URIs in
+        ElementTree notation to lists of objects.  These are URIs
+        for rdf:resource attributes and the (text) literals otherwise;
+        nested resources (i.e., blank nodes) are ignored, as are
+        top-level resources without an rdf:about.
+        """
+        about = ET_NS["rdf"]+"about"
+        resource = ET_NS["rdf"]+"resource"
+        descriptions = {}
+
+        depth = 0
+        for event, elem in etree.iterparse(
+                self.filename, events=("start", "end")):
+            if event=="start":
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth!=1:
+                continue
+
+            subject = elem.get(about)
+            if subject is not None:
+                props = descriptions.setdefault(subject, {})
+                for child in elem:
+                    ob = child.get(resource)
+                    if ob is None:
+                        if len(child):
+                            continue
+                        ob = child.text or ""
+                    objects = props.setdefault(child.tag, [])
+                    # it's RDF: no duplicate triples
+                    if ob not in objects:
+                        objects.append(ob)
+            elem.clear()
+
+        return descriptions
+
+    def _read_native_records(self):
+        """returns a list of term records (cf. _read_one_term) for the
+        terms from our namespace in our source, read directly from the
+        RDF/X.
+
+        This does what skosify does as far as it matters for the term
+        records.  That is, it makes the SKOS mapping properties and
+        skos:related symmetric, adds skos:broader for skos:narrower and
+        the hierarchical mapping properties,
+        removes skos:related between terms that are also connected through
+        skos:broader, and strips whitespace from labels and definitions.
+
+        As in _read_skos_records, terms and objects are sorted, so both
+        readers result in the same artefacts.
+        """
+        skos, ivoasem = ET_NS["skos"], ET_NS["ivoasem"]
+        descriptions = self._read_rdfx_descriptions()
+
+        def add(subject, predicate, ob):
+            objects = descriptions.setdefault(subject, {}
+                ).setdefault(predicate, [])
+            if ob not in objects:
+                objects.append(ob)
+
+        for subject, props in list(descriptions.items()):
+            for ob in list(props.get(skos+"narrower", [])
+                    )+list(props.get(skos+"narrowMatch", [])):
+                add(ob, skos+"broader", subject)
+            for ob in list(props.get(skos+"broadMatch", [])):
+                add(subject, skos+"broader", ob)
+            for ob in list(props.get(skos+"relatedMatch", [])):
+                add(subject, skos+"related", ob)
+            for predicate in ["related", "exactMatch", "closeMatch",
+                    "relatedMatch"]:
+                for ob in list(props.get(skos+predicate, [])):
+                    add(ob, skos+predicate, subject)
+
+        def get_ancestors(subject):
+            # all terms reachable through skos:broader, including subject
+            ancestors, to_visit = set(), [subject]
+            while to_visit:
+                cur = to_visit.pop()
+                if cur not in ancestors:
+                    ancestors.add(cur)
+                    to_visit.extend(descriptions.get(cur, {}).get(
+                        skos+"broader", []))
+            return ancestors
+
+        for subject, props in descriptions.items():
+            for ob in list(props.get(skos+"related", [])):
+                if ob in get_ancestors(subject):
+                    props[skos+"related"].remove(ob)
+                    other = descriptions.get(ob, {}).get(
+                        skos+"related", [])
+                    if subject in other:
+                        other.remove(subject)
+
+        def get_objects(props, predicate):
+            return sorted(self._normalise_uri(ob)
+                for ob in props.get(predicate, []))
+
+        records = []
+        for subject, props in sorted(descriptions.items()):
+            if not subject.startswith(self.baseuri):
                 # disregard all terms not belonging to us
                 continue
-            n = self._read_one_term(voc, term)
-            self.terms[n.term] = n
 
-        with open(self.filename, "r", encoding="utf-8") as f:
-            self.original_rdfx = f.read()
+            more_relations = []
+            for predicate, short_term in [
+                    (skos+"exactMatch", "skos:exactMatch"),
+                    (skos+"related", "skos:related"),
+                    (ivoasem+"useInstead", "ivoasem:useInstead")]:
+                for ob in get_objects(props, predicate):
+                    more_relations.append("{}({})".format(short_term, ob))
+            for predicate, short_term in [
+                    (ivoasem+"deprecated", "ivoasem:deprecated"),
+                    (ivoasem+"preliminary", "ivoasem:preliminary")]:
+                for ob in props.get(predicate, []):
+                    more_relations.append(short_term)
+
+            records.append((
+                self._normalise_uri(subject),
+                pick_exactly_one(
+                    (l.strip() for l in props.get(skos+"prefLabel", [])),
+                    "preferred label for {}".format(subject)),
+                pick_exactly_one(
+                    (l.strip() for l in props.get(skos+"definition", [])),
+                    "description for {}".format(subject), ""),
+                ["#"+ob for ob in get_objects(props, skos+"broader")],
+                " ".join(more_relations)))
+
+        return records
+
+    def _read_terms_source(self):
+        """creates Terms instances from RDF/X SKOS.
+
+        Depending on the skosreader key, the terms come from skosify
+        (through a cache; the default) or from the native reader.
+        """
+        if self.skosreader=="native":
+            records = self._read_native_records()
+        elif self.skosreader=="skosify":
+            records = self._get_term_records()
+        else:
+            raise ReportableError("Unknown skosreader {} in {}".format(
+                self.skosreader, self.name))
+
+        self.terms = {}
+        for record in records:
+            n = Term(self, *record)
+            self.terms[n.term] = n
 
 
 class SKOSCSVVocabulary(SKOSMixin, CSVBasedVocabulary):
@@ -1279,39 +2412,178 @@ class SKOSCSVVocabulary(SKOSMixin, CSVBasedVocabulary):
 
 ############# dead simple semantics support
 
-def to_desise_dict(voc):
-    """returns a vocabulary as a dead simple semantics dictionary.
+def iter_desise_terms(voc):
+    """iterates over term, dictionary pairs for the desise representation
+    of voc's terms, sorted by term.
     """
-    # take items from a vocabulary's meta dict rather than directly
-    # from the class so we're always in sync with whatever the turtle
-    # template gets.
-    meta = voc.get_meta_dict()
-    res = {}
-    res["uri"] = meta["baseuri"]
-    res["flavour"] = meta["flavour"]
-    res["terms"] = {}
-
-    for t in voc.terms.values():
+    for name, t in sorted(voc.terms.items()):
         d = {
             "label": t.label,
             "description": t.description}
 
-        for prop, obj in t.relations:
-            if prop.startswith("ivoasem:"):
+        for prop in ["ivoasem:preliminary", "ivoasem:deprecated",
+                "ivoasem:useInstead"]:
+            for obj in t.get_objects_for(prop):
                 d[prop[8:]] = (obj or "").lstrip("#")
 
         d["wider"] = []
         for w in t.get_objects_for(voc.wider_predicate):
             d["wider"].append(w.lstrip("#"))
 
-        res["terms"][t.term] = d
+        d["narrower"] = voc.inverted_wider.get(name, [])
+        yield name, d
 
-    for t, props in res["terms"].items():
-        props["narrower"] = voc.inverted_wider.get(t, [])
 
+def get_desise_head(voc):
+    """returns a dictionary of the desise items of voc except the terms.
+    """
+    # take items from a vocabulary's meta dict rather than directly
+    # from the class so we're always in sync with whatever the turtle
+    # template gets.
+    meta = voc.get_meta_dict()
+    return {
+        "uri": meta["baseuri"],
+        "flavour": meta["flavour"]}
+
+
+def to_desise_dict(voc):
+    """returns a vocabulary as a dead simple semantics dictionary.
+    """
+    res = get_desise_head(voc)
+    res["terms"] = dict(iter_desise_terms(voc))
     return res
 
 
+def write_desise_files(voc, pretty_file, compact_file):
+    """writes voc as desise to the open files pretty_file and compact_file.
+
+    What ends up in pretty_file is what json.dump(indent="  ") would
+    write for to_desise_dict(voc); compact_file gets the same data
+    without any whitespace.  The terms are serialised one at a time, so
+    the whole dictionary is never in memory.
+    """
+    head = get_desise_head(voc)
+    pretty_file.write("{\n")
+    for key, value in head.items():
+        pretty_file.write("  {}: {},\n".format(
+            json.dumps(key), json.dumps(value)))
+    pretty_file.write('  "terms": {')
+    compact_file.write(
+        json.dumps(head, separators=(",", ":"))[:-1]+',"terms":{')
+
+    sep = "\n"
+    for term, d in iter_desise_terms(voc):
+        key = json.dumps(term)
+        pretty_file.write("{}    {}: {}".format(sep, key,
+            json.dumps(d, indent="  ").replace("\n", "\n    ")))
+        compact_file.write("{}{}:{}".format(sep.strip(), key,
+            json.dumps(d, separators=(",", ":"))))
+        sep = ",\n"
+
+    pretty_file.write("\n  }\n}" if sep!="\n" else "}\n}")
+    compact_file.write("}}")
+
+
+############# Profiling
+
+# while --profile is active, a dictionary with a list of stage records
+# under "stages" (see profile_stage) and a mapping of vocabulary names
+# to the sizes of their artefacts under "artefacts"; None otherwise.
+PROFILE = None
+
+
+def start_profiling():
+    """(re-)initialises PROFILE and starts tracing memory allocations.
+    """
+    global PROFILE
+    PROFILE = {"stages": [], "artefacts": {}}
+    tracemalloc.start()
+
+
+@contextlib.contextmanager
+def profile_stage(vocab_name, stage_name):
+    """a context manager recording wall time, CPU time, and peak memory
+    of its body in PROFILE.
+
+    If profiling is off, this does nothing.
+    """
+    if PROFILE is None:
+        yield
+        return
+
+    tracemalloc.reset_peak()
+    mem_start = tracemalloc.get_traced_memory()[0]
+    start, cpu_start = time.time(), time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PROFILE["stages"].append({
+            "vocabulary": vocab_name,
+            "stage": stage_name,
+            "pid": os.getpid(),
+            "start": start,
+            "wall_s": time.perf_counter()-wall_start,
+            "cpu_s": time.process_time()-cpu_start,
+            "peak_bytes": tracemalloc.get_traced_memory()[1]-mem_start})
+
+
+def profile_artefacts(vocab_name, vocab_dir):
+    """records the sizes of the files in vocab_dir as the artefacts of
+    vocab_name in PROFILE.
+
+    If profiling is off, this does nothing.
+    """
+    if PROFILE is None or not os.path.isdir(vocab_dir):
+        return
+    PROFILE["artefacts"][vocab_name] = dict(
+        (name, os.path.getsize(os.path.join(vocab_dir, name)))
+        for name in sorted(os.listdir(vocab_dir)))
+
+
+def merge_profile(profile):
+    """adds the records in profile (e.g., from a worker process)
+    to PROFILE.
+    """
+    PROFILE["stages"].extend(profile["stages"])
+    PROFILE["artefacts"].update(profile["artefacts"])
+
+
+def write_profile(report_name, trace_name=None):
+    """writes the profile gathered so far as JSON to report_name and,
+    if trace_name is given, as Chrome trace events to trace_name.
+
+    The latter can be loaded into chrome://tracing or Perfetto.
+    """
+    if report_name:
+        with open(report_name, "w", encoding="utf-8") as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "stages": sorted(PROFILE["stages"],
+                    key=lambda rec: rec["start"]),
+                "artefacts": PROFILE["artefacts"],
+                "artefact_totals": dict(
+                    (vocab_name, sum(sizes.values()))
+                    for vocab_name, sizes in PROFILE["artefacts"].items()),
+            }, f, indent="  ")
+
+    if trace_name:
+        with open(trace_name, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": [{
+                    "name": rec["stage"],
+                    "cat": rec["vocabulary"],
+                    "ph": "X",
+                    "ts": rec["start"]*1e6,
+                    "dur": rec["wall_s"]*1e6,
+                    "pid": rec["pid"],
+                    "tid": rec["pid"],
+                    "args": {
+                        "vocabulary": rec["vocabulary"],
+                        "cpu_s": rec["cpu_s"],
+                        "peak_bytes": rec["peak_bytes"]}}
+                for rec in PROFILE["stages"]]}, f)
+
+
 ############# Top-level control
 
 # a dictionary mapping vocabulary flavour to implementing class
@@ -1342,16 +2614,272 @@ def get_vocabulary(config, vocab_name):
     return cls(meta)
 
 
-def build_vocab_repr(config, vocab_name, dest_dir):
+def get_source_name(config, vocab_name):
+    """returns the name of the source file of vocab_name.
+
+    This mirrors the filename defaulting in Vocabulary.
+    """
+    path = config.get(vocab_name, "path", fallback=vocab_name)
+    return config.get(vocab_name, "filename",
+        fallback=os.path.join(path, "terms.csv"))
+
+
+def get_source_size(config, vocab_name):
+    """returns the size of the source file of vocab_name in bytes.
+
+    Unreadable sources count as empty; their errors will be reported when
+    the vocabulary is actually built.
+    """
+    try:
+        return os.path.getsize(get_source_name(config, vocab_name))
+    except OSError:
+        return 0
+
+
+def compute_build_key(config, vocab_name):
+    """returns a hash over everything that goes into building vocab_name.
+
+    That is the content of its source file, its section in config, and
+    the source of this converter, such that an update of the tooling
+    invalidates all previous builds.
+
+    If the source file cannot be read, this returns None, which never
+    matches a stored key.
+    """
+    digest = hashlib.sha256()
+    with open(__file__, "rb") as f:
+        digest.update(f.read())
+    digest.update(json.dumps(config.items(vocab_name)).encode("utf-8"))
+
+    try:
+        with open(get_source_name(config, vocab_name), "rb") as f:
+            digest.update(f.read())
+    except IOError:
+        return None
+
+    return digest.hexdigest()
+
+
+def write_precompressed(path):
+    """writes compressed copies of the file at path to path.gz and,
+    if the brotli module is available, path.br.
+
+    This returns the names of the files written.  The gzip files have no
+    timestamp, so the same input always results in the same bytes.
+    Compressed files that decompress to the content of path are not
+    written again; decompressing is much cheaper than compressing, and
+    unlike modification dates, this cannot be fooled by sources restored
+    with old dates.
+    """
+    try:
+        import brotli
+    except ImportError:
+        # brotli is optional; clients then get gzip or the plain file
+        brotli = None
+
+    compressors = [(path+".gz",
+        lambda data: gzip.compress(data, compresslevel=9, mtime=0),
+        gzip.decompress)]
+    if brotli is not None:
+        compressors.append((path+".br",
+            lambda data: brotli.compress(data, quality=BROTLI_QUALITY),
+            brotli.decompress))
+
+    with open(path, "rb") as f:
+        data = f.read()
+    for dest_name, compress, decompress in compressors:
+        if os.path.exists(dest_name):
+            with open(dest_name, "rb") as f:
+                try:
+                    if decompress(f.read())==data:
+                        continue
+                except Exception:
+                    # broken compressed file; write it again
+                    pass
+
+        with open_if_changed(dest_name, binary=True) as f:
+            f.write(compress(data))
+
+    return [dest_name for dest_name, _, _ in compressors]
+
+
+def write_html_assets(dest_dir):
+    """writes the files in HTML_ASSETS into dest_dir.
+
+    The files are written through open_if_changed, so intact assets keep
+    their modification dates, while half-written ones (e.g., from an
+    interrupted build) are repaired.  Assets of older builds are not
+    removed, as pages of these may still refer to them.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    for file_name, content in HTML_ASSETS.values():
+        dest_path = os.path.join(dest_dir, file_name)
+        with open_if_changed(dest_path) as f:
+            f.write(content)
+        write_precompressed(dest_path)
+
+
+def get_version_dir(config, vocab_name, dest_dir):
+    """returns the directory below dest_dir that write_representation
+    puts the artefacts of vocab_name into.
+
+    If vocab_name has no timestamp, there is no such directory, and this
+    returns None; the vocabulary's validation will then complain.
+    """
+    timestamp = config.get(vocab_name, "timestamp", fallback=None)
+    if timestamp is None:
+        return None
+    return os.path.join(dest_dir,
+        config.get(vocab_name, "path", fallback=vocab_name),
+        timestamp)
+
+
+def get_build_key_path(version_dir):
+    """returns the path of the file recording what the artefacts in
+    version_dir were built from.
+
+    This is in BUILD_KEY_DIR below CACHE_DIR, named after a hash of the
+    absolute path of version_dir, so the published tree only contains
+    artefacts.
+    """
+    return os.path.join(CACHE_DIR, BUILD_KEY_DIR, "{}.key".format(
+        hashlib.sha256(os.path.abspath(version_dir).encode("utf-8")
+            ).hexdigest()))
+
+
+def get_manifest_digest(version_dir):
+    """returns the sha256 hash of the manifest in version_dir, or None
+    if it or any of the files listed in it are missing.
+
+    As build keys are not kept with the artefacts, they record this
+    so removed or incomplete version directories are rebuilt.
+    """
+    try:
+        with open(os.path.join(version_dir, MANIFEST_NAME), "rb") as f:
+            manifest = f.read()
+    except IOError:
+        return None
+
+    for ln in manifest.decode("utf-8").splitlines():
+        name = ln.partition("  ")[2]
+        if not os.path.isfile(os.path.join(version_dir, name)):
+            return None
+    return hashlib.sha256(manifest).hexdigest()
+
+
+def build_vocab_repr(config, vocab_name, dest_dir, force=False):
     """writes the representation of the vocabulary vocab_name (a section
     within config) as defined in the ConfigParser instance config.
 
     dest_dir is the root of the vocabularies repository (i.e., the
     generated hierarchy will be a child of it).
+
+    Unless force is True, nothing is done when the artefacts below dest_dir
+    were built from the same inputs (cf. compute_build_key).  This
+    returns True if the vocabulary was actually built.
     """
-    vocab = get_vocabulary(config, vocab_name)
+    version_dir = get_version_dir(config, vocab_name, dest_dir)
+    key_path, build_key = None, None
+    if version_dir is not None:
+        key_path = get_build_key_path(version_dir)
+        build_key = compute_build_key(config, vocab_name)
+
+    if not force and build_key is not None:
+        try:
+            with open(key_path, "r", encoding="utf-8") as f:
+                if f.read().split()==[
+                        build_key, get_manifest_digest(version_dir)]:
+                    profile_artefacts(vocab_name, version_dir)
+                    return False
+        except IOError:
+            pass
+
+    with profile_stage(vocab_name, "load"):
+        vocab = get_vocabulary(config, vocab_name)
+    # artefacts are updated in place; make sure a build failing half-way
+    # is not mistaken for a complete one later
+    if key_path is not None and os.path.exists(key_path):
+        os.unlink(key_path)
     vocab.write_representation(dest_dir)
 
+    # only write the key once everything has been written so
+    # broken builds are retried
+    if build_key is not None:
+        try:
+            os.makedirs(os.path.dirname(key_path), exist_ok=True)
+            with open(key_path, "w", encoding="utf-8") as f:
+                f.write("{} {}\n".format(
+                    build_key, get_manifest_digest(version_dir)))
+        except OSError as ex:
+            sys.stderr.write("Warning: Cannot write build key: {}\n".format(
+                ex))
+    profile_artefacts(vocab_name, version_dir)
+    return True
+
+
+def _build_in_worker(config_name, vocab_name, dest_dir, force, profile):
+    """builds vocab_name within a worker process of build_in_parallel.
+
+    This returns a pair of None on success or the message of a
+    ReportableError otherwise, and, if profile is true, the profile
+    of the build (or None).  All other exceptions propagate to the
+    parent process.
+    """
+    if profile:
+        start_profiling()
+
+    msg = None
+    try:
+        build_vocab_repr(
+            parse_config(config_name), vocab_name, dest_dir, force)
+    except ReportableError as ex:
+        msg = str(ex)
+    return msg, PROFILE
+
+
+def build_in_parallel(config_name, to_build, dest_dir, n_jobs, force=False):
+    """builds the vocabularies in to_build in a pool of n_jobs processes.
+
+    The vocabularies with the largest sources are scheduled first, so
+    the slow ones do not end up waiting behind the small ones.
+
+    This returns a dictionary mapping the names of vocabularies that
+    failed with a ReportableError to the respective messages.
+
+    If profiling is on, the profiles of the workers are merged into
+    PROFILE.
+    """
+    from concurrent import futures
+
+    config = parse_config(config_name)
+    to_build = sorted(to_build,
+        key=lambda vocab_name: get_source_size(config, vocab_name),
+        reverse=True)
+
+    errors = {}
+    with futures.ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        jobs = dict(
+            (pool.submit(_build_in_worker,
+                    config_name, vocab_name, dest_dir, force,
+                    PROFILE is not None),
+                vocab_name)
+            for vocab_name in to_build)
+
+        for job in futures.as_completed(jobs):
+            try:
+                msg, profile = job.result()
+            except Exception:
+                sys.stderr.write("While building {}:\n".format(jobs[job]))
+                pool.shutdown(cancel_futures=True)
+                raise
+
+            if profile is not None:
+                merge_profile(profile)
+            if msg is not None:
+                errors[jobs[job]] = msg
+
+    return errors
+
 
 def parse_config(config_name):
     """parses the vocabulary configuration in config_name and returns
@@ -1401,6 +2929,35 @@ def parse_command_line():
         dest="dest_dir",
         default="build",
         metavar="PATH")
+    parser.add_argument("--jobs",
+        help="Build up to N vocabularies in parallel worker processes."
+        "  Errors are collected and reported once all vocabularies"
+        " have been processed.",
+        action="store",
+        dest="n_jobs",
+        default=1,
+        type=int,
+        metavar="N")
+    parser.add_argument("--force",
+        help="Rebuild vocabularies even if their sources, their"
+        " configuration, and the converter are unchanged since the"
+        " last build into the destination directory.",
+        action="store_true",
+        dest="force")
+    parser.add_argument("--profile",
+        help="Write wall and CPU times as well as peak memory for"
+        " loading each vocabulary and for each of its writers, and the"
+        " sizes of the artefacts, to FILE as JSON.  Memory tracing"
+        " makes the build considerably slower.",
+        action="store",
+        dest="profile_name",
+        metavar="FILE")
+    parser.add_argument("--profile-trace",
+        help="Write the timings as Chrome trace events to FILE.  This"
+        " profiles the build even without --profile.",
+        action="store",
+        dest="profile_trace_name",
+        metavar="FILE")
     args = parser.parse_args()
 
     if not args.root_uri.endswith("/"):
@@ -1409,6 +2966,30 @@ def parse_command_line():
     return args
 
 
+def build_all(args, config, to_build):
+    """builds the vocabularies in to_build as requested in the command
+    line arguments args.
+    """
+    if args.n_jobs>1:
+        errors = build_in_parallel(args.config_name,
+            to_build, args.dest_dir, args.n_jobs, args.force)
+        if errors:
+            raise ReportableError(
+                "{} of {} vocabularies failed to build:\n{}".format(
+                    len(errors),
+                    len(to_build),
+                    "\n".join("  {}: {}".format(vocab_name, msg)
+                        for vocab_name, msg in sorted(errors.items()))))
+        return
+
+    for vocab_name in to_build:
+        try:
+            build_vocab_repr(config, vocab_name, args.dest_dir, args.force)
+        except Exception:
+            sys.stderr.write("While building {}:\n".format(vocab_name))
+            raise
+
+
 def main():
     args = parse_command_line()
     config = parse_config(args.config_name)
@@ -1418,12 +2999,17 @@ def main():
     else:
         to_build = [args.vocab_name]
 
-    for vocab_name in to_build:
-        try:
-            build_vocab_repr(config, vocab_name, args.dest_dir)
-        except Exception:
-            sys.stderr.write("While building {}:\n".format(vocab_name))
-            raise
+    write_html_assets(args.dest_dir)
+
+    profiling = args.profile_name or args.profile_trace_name
+    if profiling:
+        start_profiling()
+
+    try:
+        build_all(args, config, to_build)
+    finally:
+        if profiling:
+            write_profile(args.profile_name, args.profile_trace_name)
 
 
 if __name__=="__main__":
@@ -44,11 +44,27 @@ The generation of the apache config for the RDF repo works by picking up
 files named htaccess-fragment.txt from the vocabulary directories and
 retaining the most recent one for each vocabulary.
 
+Since apache then evaluates a chain of rewrite rules growing with the
+number of vocabularies on each request, we also write lookup tables
+from the negotiation.json files convert.py leaves next to the fragments:
+
+* rdfrepo-map.txt -- an apache RewriteMap (txt; use httxt2dbm to turn it
+  into a dbm map) from vocabulary paths to the stems of the files
+  of the current version.
+* rdfrepo-map.conf -- a replacement for rdfrepo.conf doing the content
+  negotiation with a few rules looking up vocabularies in that map.
+  Since RewriteMap is not allowed in .htaccess files, the map must be
+  declared in the server configuration (see HT_ACCESS_MAP_RULES).
+* rdfrepo-map.json -- the same information in JSON for other servers;
+  it maps the vocabulary paths to objects with the version timestamp,
+  the files to deliver per media type, and the default media type.
+
 Written by Markus Demleitner <msdemlei@ari.uni-heidelberg.de>, August 2018
 """
 
 import glob
 import io
+import json
 import re
 import os
 import sys
@@ -77,12 +93,116 @@ AddType application/x-desise+json .desise
 AddCharset UTF-8 .ttl
 AddCharset UTF-8 .html
 AddCharset UTF-8 .desise
+AddEncoding gzip .gz
+AddEncoding br .br
+
+# convert.py writes the CSS and javascript of the HTML pages into files
+# with hashes of their content in their names; these never change.
+<IfModule mod_headers.c>
+  <FilesMatch "^vocab-[0-9a-f]+\\.(css|js)(\\.gz|\\.br)?$">
+    Header set Cache-Control "public, max-age=31536000, immutable"
+  </FilesMatch>
+
+  # responses for these depend on Accept-Encoding (see below)
+  <FilesMatch "\\.(ttl|rdf|json|desise|html|css|js)(\\.gz|\\.br)?$">
+    Header append Vary Accept-Encoding
+  </FilesMatch>
+</IfModule>
 
 RewriteEngine On
 RewriteBase /rdf/
 DirectorySlash Off
 RedirectMatch 302 ^/rdf$ /rdf/
 
+# convert.py leaves brotli (if it could) and gzip compressed siblings
+# of its artefacts; hand these out to clients accepting them rather
+# than having the server compress on each request.
+RewriteCond %{HTTP:Accept-Encoding} \\bbr\\b
+RewriteCond %{REQUEST_FILENAME}.br -s
+RewriteRule ^(.+\\.(ttl|rdf|json|desise|html|css|js))$ $1.br [L,E=no-gzip:1,E=no-brotli:1]
+
+RewriteCond %{HTTP:Accept-Encoding} \\bgzip\\b
+RewriteCond %{REQUEST_FILENAME}.gz -s
+RewriteRule ^(.+\\.(ttl|rdf|json|desise|html|css|js))$ $1.gz [L,E=no-gzip:1,E=no-brotli:1]
+
+# Without these, the precompressed files would get the media type of
+# their last extension (with stock mime.types, application/gzip for .gz)
+# rather than that of what they contain.  As in apache's recipe for
+# precompressed content, this applies once the rules above have
+# rewritten the request.  The types must agree with the AddType and
+# AddCharset directives above and with serve-rdf.MEDIA_TYPES.
+RewriteRule \\.ttl\\.(gz|br)$ - [T=text/turtle;charset=UTF-8,E=no-gzip:1,E=no-brotli:1]
+RewriteRule \\.rdf\\.(gz|br)$ - [T=application/rdf+xml,E=no-gzip:1,E=no-brotli:1]
+RewriteRule \\.json\\.(gz|br)$ - [T=application/json,E=no-gzip:1,E=no-brotli:1]
+RewriteRule \\.desise\\.(gz|br)$ - [T=application/x-desise+json;charset=UTF-8,E=no-gzip:1,E=no-brotli:1]
+RewriteRule \\.html\\.(gz|br)$ - [T=text/html;charset=UTF-8,E=no-gzip:1,E=no-brotli:1]
+RewriteRule \\.css\\.(gz|br)$ - [T=text/css,E=no-gzip:1,E=no-brotli:1]
+RewriteRule \\.js\\.(gz|br)$ - [T=application/javascript,E=no-gzip:1,E=no-brotli:1]
+
+"""
+# caching; this is appended to HT_ACCESS_HEADER with the lifetime
+# of the content negotiation redirects filled in.
+HT_ACCESS_CACHING_TEMPLATE = """# Files in vocabulary version directories (<path>/<timestamp>/) never
+# change once published.  convert.py keeps its build state elsewhere,
+# so these directories only contain artefacts; dotfiles are excluded
+# anyway, in case older builds left any.  The redirects from the
+# vocabulary URIs to them (marked with vocab_negotiated by the rewrite
+# rules) change with each new version and may only be cached briefly;
+# since they depend on what clients accept, caches must consider Accept.
+<IfModule mod_headers.c>
+  <If "%{{REQUEST_URI}} =~ m#/[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}/[^/.][^/]*$#">
+    Header set Cache-Control "public, max-age=31536000, immutable"
+  </If>
+
+  Header always set Cache-Control "public, max-age={redirect_ttl}" env=vocab_negotiated
+  Header always append Vary Accept env=vocab_negotiated
+</IfModule>
+
+# These ETags come from modification dates and sizes; apache cannot
+# take them from the SHA256SUMS manifests in the version directories,
+# which this configuration does not use at all (they are for
+# sha256sum -c and for servers like serve-rdf.py).  convert.py only
+# replaces files whose content changes, so the ETags are stable over
+# rebuilds -- but only if the deployment preserves modification times:
+# copy the build tree with rsync -t (or -a), never with plain cp or
+# rsync without -t, or all ETags change on each deployment.
+FileETag MTime Size
+"""
+
+# the default for --redirect-ttl, in seconds
+DEFAULT_REDIRECT_TTL = 600
+
+
+# content negotiation by looking up vocabularies in rdfrepo-map.txt.
+# The extensions must agree with convert.NEGOTIATED_FILES.
+HT_ACCESS_MAP_RULES = """# Content negotiation through a lookup in the vocabulary map written by
+# make-rdf-index.py.  RewriteMap is not allowed here; declare the map
+# in the server or virtual host configuration, as in
+#
+#   RewriteMap vocabs txt:/var/www/docs/rdf/rdfrepo-map.txt
+#
+# or, for constant-time lookups, after running
+# httxt2dbm -i rdfrepo-map.txt -o rdfrepo-map.dbm, as
+#
+#   RewriteMap vocabs dbm:/var/www/docs/rdf/rdfrepo-map.dbm
+RewriteCond %{HTTP_ACCEPT} application/rdf\\+xml
+RewriteCond ${vocabs:$1} (.+)
+RewriteRule ^(.+?)/?$ %1.rdf [R=303,L,E=vocab_negotiated:1]
+
+RewriteCond %{HTTP_ACCEPT} text/turtle
+RewriteCond ${vocabs:$1} (.+)
+RewriteRule ^(.+?)/?$ %1.ttl [R=303,L,E=vocab_negotiated:1]
+
+RewriteCond %{HTTP_ACCEPT} application/ld\\+json
+RewriteCond ${vocabs:$1} (.+)
+RewriteRule ^(.+?)/?$ %1.json [R=303,L,E=vocab_negotiated:1]
+
+RewriteCond %{HTTP_ACCEPT} application/x-desise\\+json
+RewriteCond ${vocabs:$1} (.+)
+RewriteRule ^(.+?)/?$ %1.min.desise [R=303,L,E=vocab_negotiated:1]
+
+RewriteCond ${vocabs:$1} (.+)
+RewriteRule ^(.+?)/?$ %1.html [R=303,L,E=vocab_negotiated:1]
 """
 
 
@@ -214,7 +334,10 @@ def iter_voc_descriptors():
     """iterates over dictionaries describing the vocabularies below the
     current directory.
 
-    Each dictionary has the keys name, description, last change, and uri.
+    Each dictionary has the keys name, description, last change, and uri,
+    as well as htaccess (the apache config fragment, possibly empty) and
+    negotiation (the content of negotiation.json, or None if there is
+    none).
     """
     for path in find_meta_infs("."):
         with open(path, "r", encoding="utf-8") as f:
@@ -245,6 +368,12 @@ def iter_voc_descriptors():
             with open(htpath, encoding="utf-8") as f:
                 meta["htaccess"] = f.read()
 
+        meta["negotiation"] = None
+        negpath = os.path.join(os.path.dirname(path), "negotiation.json")
+        if os.path.exists(negpath):
+            with open(negpath, encoding="utf-8") as f:
+                meta["negotiation"] = json.load(f)
+
         yield meta
 
 
@@ -330,6 +459,38 @@ def fill_template(template, vocabs):
         get_vocab_table(vocabs))
 
 
+def get_rewrite_map(vocabs):
+    """returns the content of an apache txt RewriteMap for the vocabularies
+    with negotiation information in vocabs.
+
+    This maps vocabulary paths to path/timestamp/name, which is where
+    the files for content negotiation are, sans extension.
+    """
+    lines = ["# vocabulary path -> file stem; generated by make-rdf-index.py"]
+    for neg in sorted((v["negotiation"] for v in vocabs if v["negotiation"]),
+            key=lambda neg: neg["path"]):
+        lines.append("{} {}/{}/{}".format(
+            neg["path"], neg["path"], neg["timestamp"], neg["name"]))
+    return "\n".join(lines)+"\n"
+
+
+def get_negotiation_map(vocabs):
+    """returns a dictionary mapping vocabulary paths to their
+    content negotiation information for the vocabularies in vocabs.
+
+    The values are dictionaries with the keys timestamp, files (media
+    type to path relative to the repository root), and default (the
+    media type to deliver to clients not asking for any other).
+    """
+    return dict((neg["path"], {
+            "timestamp": neg["timestamp"],
+            "files": neg["files"],
+            "default": neg["default"]})
+        for neg in sorted(
+            (v["negotiation"] for v in vocabs if v["negotiation"]),
+            key=lambda neg: neg["path"]))
+
+
 def get_voc_sort_key(voc):
     """returns a sort key for a vocabulary.
 
@@ -339,9 +500,34 @@ def get_voc_sort_key(voc):
     return (voc.get("status")=="Draft", voc["name"])
 
 
+def get_ht_access_header(redirect_ttl):
+    """returns the common part of the apache configurations, with
+    content negotiation redirects cacheable for redirect_ttl seconds.
+    """
+    return HT_ACCESS_HEADER+HT_ACCESS_CACHING_TEMPLATE.format(
+        redirect_ttl=redirect_ttl)
+
+
+def parse_command_line():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Writes the vocabulary index and the apache"
+        " configuration for an RDF repository.")
+    parser.add_argument("rdf_dir",
+        help="Root directory of the RDF repository.",
+        metavar="rdf-directory")
+    parser.add_argument("--redirect-ttl",
+        help="Let caches keep the redirects of content negotiation"
+        " for SECONDS seconds (default: %(default)s).",
+        dest="redirect_ttl",
+        type=int,
+        default=DEFAULT_REDIRECT_TTL,
+        metavar="SECONDS")
+    return parser.parse_args()
+
+
 def main():
-    if len(sys.argv)!=2:
-        die("Usage: {} <rdf-directory>\n".format(sys.argv[0]))
+    args = parse_command_line()
 
     try:
         with open("index.template", "r", encoding="utf-8") as f:
@@ -350,7 +536,7 @@ def main():
         die("Cannot read HTML index.template")
 
     try:
-        os.chdir(sys.argv[1])
+        os.chdir(args.rdf_dir)
 
         vocabs = list(iter_voc_descriptors())
         vocabs.sort(key=get_voc_sort_key)
@@ -360,12 +546,28 @@ def main():
         with open("index.html", "w", encoding="utf-8") as f:
             f.write(rendered)
 
-        ht_access = [HT_ACCESS_HEADER]
+        ht_access_header = get_ht_access_header(args.redirect_ttl)
+        ht_access = [ht_access_header]
         for v in vocabs:
             ht_access.extend(["", v["htaccess"]])
         with open("rdfrepo.conf", "w", encoding="utf-8") as f:
             f.write("\n".join(ht_access))
 
+        # vocabularies without negotiation.json (e.g., external ones) still
+        # need their fragments.
+        ht_access = [ht_access_header, HT_ACCESS_MAP_RULES]
+        for v in vocabs:
+            if not v["negotiation"]:
+                ht_access.extend(["", v["htaccess"]])
+        with open("rdfrepo-map.conf", "w", encoding="utf-8") as f:
+            f.write("\n".join(ht_access))
+
+        with open("rdfrepo-map.txt", "w", encoding="utf-8") as f:
+            f.write(get_rewrite_map(vocabs))
+
+        with open("rdfrepo-map.json", "w", encoding="utf-8") as f:
+            json.dump(get_negotiation_map(vocabs), f, indent="  ")
+
     except ReportableError as msg:
         die(str(msg))
 
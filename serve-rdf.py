@@ -0,0 +1,626 @@
+"""
+A stand-in for the apache server of the IVOA RDF repository.
+
+This serves a tree built by convert.py (i.e., its --dest-dir) over HTTP,
+for load tests and integration tests without an apache at hand.  It
+does content negotiation by interpreting the htaccess-fragment.txt files
+in the tree, i.e., exactly the rules convert.py writes for apache, and
+otherwise mimics what the configuration from make-rdf-index.py does:
+
+* the tree is served below --prefix (/rdf/ by default, which is where
+  make-rdf-index.py's RewriteBase puts it);
+* clients accepting br or gzip get the precompressed siblings of files
+  if they exist, declared with the media type of the uncompressed file;
+* files in vocabulary version directories and the HTML assets may be
+  cached indefinitely, the content negotiation redirects for
+  --redirect-ttl seconds;
+* ETags are the sha256 hashes from the SHA256SUMS manifests where
+  available and derived from size and modification date otherwise;
+  If-None-Match is honoured.
+
+Files are kept in memory once read; they are re-read when their
+modification date or size changes.  The rewrite rules, however, are
+only read on startup, so restart the server after building new
+vocabulary versions.
+
+Of the mod_rewrite language, we only understand what convert.py
+produces: RewriteCond on %{HTTP_ACCEPT} and RewriteRule with the R, L,
+and E flags.  Anything else in the fragments is an error.
+
+With --self-check, the server is started on a free port and requests
+for every vocabulary in the tree are checked against what its
+negotiation.json says content negotiation should deliver.
+"""
+
+import asyncio
+import email.utils
+import gzip
+import mimetypes
+import os
+import re
+import sys
+import threading
+
+
+# keep this in sync with make-rdf-index.DEFAULT_REDIRECT_TTL
+DEFAULT_REDIRECT_TTL = 600
+
+# the media types of make-rdf-index's AddType and AddCharset directives
+# (and of the T flags on its rules for precompressed files), and what
+# stock mime.types says for .gz
+MEDIA_TYPES = {
+    ".rdf": "application/rdf+xml",
+    ".ttl": "text/turtle; charset=UTF-8",
+    ".desise": "application/x-desise+json; charset=UTF-8",
+    ".html": "text/html; charset=UTF-8",
+    ".json": "application/json",
+    ".css": "text/css",
+    ".js": "application/javascript",
+    ".gz": "application/gzip",
+}
+
+# files with precompressed siblings, as in make-rdf-index's rewrite rules
+PRECOMPRESSED_RE = re.compile(r".+\.(ttl|rdf|json|desise|html|css|js)$")
+
+# the content encodings we deliver, in order of preference, with the
+# regular expression for Accept-Encoding make-rdf-index uses
+ENCODINGS = [
+    ("br", ".br", re.compile(r"\bbr\b")),
+    ("gzip", ".gz", re.compile(r"\bgzip\b"))]
+
+# what make-rdf-index lets caches keep indefinitely
+IMMUTABLE_RE = re.compile(
+    r"(/[0-9]{4}-[0-9]{2}-[0-9]{2}/[^/.][^/]*"
+    r"|/vocab-[0-9a-f]+\.(css|js)(\.gz|\.br)?)$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# must agree with convert.MANIFEST_NAME
+MANIFEST_NAME = "SHA256SUMS"
+
+STATUS_PHRASES = {
+    200: "OK",
+    302: "Found",
+    303: "See Other",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+}
+
+
+class ReportableError(Exception):
+    pass
+
+
+def die(msg):
+    sys.stderr.write(msg)
+    sys.exit(1)
+
+
+############ mod_rewrite emulation
+
+class RewriteRule(object):
+    """A RewriteRule with the RewriteConds preceding it.
+
+    conditions is a list of compiled regular expressions that must all
+    match the Accept header.  flags is the list of items in the rule's
+    brackets.
+    """
+    def __init__(self, pattern, target, flags, conditions):
+        self.pattern = re.compile(pattern)
+        self.target = target
+        self.conditions = conditions
+        self.last = False
+        self.status = None
+        self.env = {}
+
+        for flag in flags:
+            name, _, value = flag.partition("=")
+            if name=="L":
+                self.last = True
+            elif name=="R":
+                self.status = int(value or 302)
+            elif name=="E":
+                var, _, val = value.partition(":")
+                self.env[var] = val
+            else:
+                raise ReportableError(
+                    "Unsupported RewriteRule flag {}".format(flag))
+
+    def apply(self, path, accept, env):
+        """returns the rewritten path if this rule matches path (without
+        the prefix) for a request with the Accept header accept, None
+        otherwise.
+
+        If it matches, the rule's environment variables are set in env.
+        """
+        mat = self.pattern.search(path)
+        if not mat:
+            return None
+        for cond in self.conditions:
+            if not cond.search(accept):
+                return None
+
+        env.update(self.env)
+        return re.sub(r"\$(\d)",
+            lambda m: mat.group(int(m.group(1))) or "", self.target)
+
+
+def parse_rewrite_rules(f):
+    """returns a list of RewriteRule instances for the mod_rewrite
+    directives in the open file f.
+    """
+    rules, conditions = [], []
+    for ln_no, ln in enumerate(f, 1):
+        parts = ln.split()
+        if not parts or parts[0].startswith("#"):
+            continue
+
+        if parts[0]=="RewriteCond" and len(parts)==3:
+            if parts[1]!="%{HTTP_ACCEPT}":
+                raise ReportableError("{}, {}: Only conditions on"
+                    " %{{HTTP_ACCEPT}} are supported".format(f.name, ln_no))
+            conditions.append(re.compile(parts[2]))
+
+        elif parts[0]=="RewriteRule" and len(parts) in (3, 4):
+            flags = parts[3].strip("[]").split(",") if len(parts)==4 else []
+            rules.append(RewriteRule(parts[1], parts[2], flags, conditions))
+            conditions = []
+
+        else:
+            raise ReportableError("{}, {}: Unsupported directive".format(
+                f.name, ln_no))
+    return rules
+
+
+def load_rewrite_rules(root_dir):
+    """returns a list of RewriteRule-s from all htaccess fragments
+    below root_dir.
+
+    As in make-rdf-index.py, the fragments are concatenated in the
+    order of the vocabulary names; since the rules of different
+    vocabularies never match the same paths, that does not matter much.
+    """
+    rules = []
+    for dirpath, dirnames, filenames in sorted(os.walk(root_dir)):
+        if "htaccess-fragment.txt" in filenames:
+            with open(os.path.join(dirpath, "htaccess-fragment.txt"),
+                    encoding="utf-8") as f:
+                rules.extend(parse_rewrite_rules(f))
+    return rules
+
+
+def rewrite(rules, path, accept):
+    """returns a triple of (status, path, env) for running path through
+    rules.
+
+    status is the redirect status if a rule asked for one, None for
+    (possibly internally rewritten) paths.  env is a dictionary of
+    the environment variables set by the rules that matched.
+    """
+    status, env = None, {}
+    for rule in rules:
+        new_path = rule.apply(path, accept, env)
+        if new_path is None:
+            continue
+        path = new_path
+        status = rule.status or status
+        if rule.last:
+            break
+    return status, path, env
+
+
+############ static files
+
+class FileCache(object):
+    """An in-memory cache for files below root_dir.
+
+    get returns triples of (body, etag, last_modified) and checks the
+    files' modification dates and sizes on each access.
+    """
+    def __init__(self, root_dir):
+        self.root_dir = os.path.abspath(root_dir)
+        self.files = {}
+        self.manifests = {}
+
+    def _get_manifest(self, dir_name):
+        """returns a dictionary mapping file names in dir_name to their
+        sha256 hashes according to its manifest.
+        """
+        manifest_path = os.path.join(dir_name, MANIFEST_NAME)
+        try:
+            mtime = os.stat(manifest_path).st_mtime_ns
+        except OSError:
+            return {}
+
+        cached = self.manifests.get(dir_name)
+        if cached and cached[0]==mtime:
+            return cached[1]
+
+        hashes = {}
+        with open(manifest_path, encoding="utf-8") as f:
+            for ln in f:
+                digest, _, name = ln.rstrip("\n").partition("  ")
+                hashes[name] = digest
+        self.manifests[dir_name] = (mtime, hashes)
+        return hashes
+
+    def get_path(self, rel_path):
+        """returns the absolute path of rel_path below root_dir or None
+        if it would point outside of it.
+        """
+        path = os.path.normpath(os.path.join(self.root_dir, rel_path))
+        if path!=self.root_dir and not path.startswith(self.root_dir+os.sep):
+            return None
+        return path
+
+    def get(self, path):
+        """returns (body, etag, last_modified) for the file at path, or
+        None if it is not a regular file.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        cached = self.files.get(path)
+        if cached and cached[0]==(st.st_mtime_ns, st.st_size):
+            return cached[1]
+
+        with open(path, "rb") as f:
+            body = f.read()
+        digest = self._get_manifest(os.path.dirname(path)).get(
+            os.path.basename(path))
+        if digest:
+            etag = '"{}"'.format(digest[:32])
+        else:
+            etag = '"{:x}-{:x}"'.format(st.st_size, st.st_mtime_ns//1000)
+
+        entry = (body, etag, email.utils.formatdate(st.st_mtime, usegmt=True))
+        self.files[path] = ((st.st_mtime_ns, st.st_size), entry)
+        return entry
+
+
+def get_media_type(path):
+    """returns the media type to declare for the file at path.
+
+    As with apache's mod_mime, this is the type of the last extension,
+    except that make-rdf-index's rewrite rules force the type of the
+    uncompressed file on precompressed files.
+    """
+    stem, ext = os.path.splitext(path)
+    if ext in [e for _, e, _ in ENCODINGS] and PRECOMPRESSED_RE.match(stem):
+        return get_media_type(stem)
+    if ext in MEDIA_TYPES:
+        return MEDIA_TYPES[ext]
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def etag_matches(if_none_match, etag):
+    """returns True if the If-None-Match header if_none_match matches etag.
+
+    This is the weak comparison RFC 9110 prescribes for If-None-Match.
+    """
+    if if_none_match.strip()=="*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag==etag:
+            return True
+    return False
+
+
+############ HTTP
+
+class RDFServer(object):
+    """The HTTP server proper.
+
+    Construct it with the root of the build tree; handle_connection
+    is what asyncio.start_server wants.
+    """
+    def __init__(self, root_dir, prefix="/rdf/",
+            redirect_ttl=DEFAULT_REDIRECT_TTL):
+        self.prefix = "/"+prefix.strip("/")+"/"
+        self.redirect_ttl = redirect_ttl
+        self.rules = load_rewrite_rules(root_dir)
+        self.cache = FileCache(root_dir)
+
+    def respond(self, method, target, headers):
+        """returns a triple of (status, header list, body) for a request.
+
+        headers is a dictionary with lowercase header names.
+        """
+        if method not in ("GET", "HEAD"):
+            return 405, [("Allow", "GET, HEAD")], b""
+
+        uri_path = target.split("?", 1)[0]
+        if uri_path==self.prefix.rstrip("/"):
+            return self.redirect(302, self.prefix, headers)
+        if not uri_path.startswith(self.prefix):
+            return 404, [], b""
+
+        status, path, env = rewrite(self.rules,
+            uri_path[len(self.prefix):], headers.get("accept", ""))
+        if status:
+            response = self.redirect(status, self.prefix+path, headers)
+            if "vocab_negotiated" in env:
+                response[1].extend([
+                    ("Cache-Control",
+                        "public, max-age={}".format(self.redirect_ttl)),
+                    ("Vary", "Accept")])
+            return response
+
+        return self.serve_file(path, headers)
+
+    def redirect(self, status, location, headers):
+        """returns a response redirecting to the local path location.
+        """
+        host = headers.get("host", "localhost")
+        return status, [("Location", "http://{}{}".format(host, location))
+            ], b""
+
+    def serve_file(self, path, headers):
+        """returns a response delivering path (relative to the root).
+        """
+        file_path = self.cache.get_path(path)
+        if file_path and os.path.isdir(file_path):
+            file_path = os.path.join(file_path, "index.html")
+        if file_path is None:
+            return 404, [], b""
+
+        response_headers, encoding, variant_path = [], None, file_path
+        if PRECOMPRESSED_RE.match(file_path):
+            response_headers.append(("Vary", "Accept-Encoding"))
+            accept_encoding = headers.get("accept-encoding", "")
+            for encoding_name, ext, encoding_re in ENCODINGS:
+                if (encoding_re.search(accept_encoding)
+                        and os.path.isfile(file_path+ext)
+                        and os.path.getsize(file_path+ext)):
+                    encoding, variant_path = encoding_name, file_path+ext
+                    break
+
+        entry = self.cache.get(variant_path)
+        if entry is None:
+            return 404, [], b""
+        body, etag, last_modified = entry
+
+        response_headers.extend([
+            ("Content-Type", get_media_type(variant_path)),
+            ("ETag", etag),
+            ("Last-Modified", last_modified)])
+        if encoding:
+            response_headers.append(("Content-Encoding", encoding))
+        if IMMUTABLE_RE.search(file_path):
+            response_headers.append(
+                ("Cache-Control", IMMUTABLE_CACHE_CONTROL))
+
+        if etag_matches(headers.get("if-none-match", ""), etag):
+            return 304, response_headers, b""
+        return 200, response_headers, body
+
+    async def handle_connection(self, reader, writer):
+        """serves HTTP/1.1 requests on a connection until the client
+        closes it or asks for that.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode(
+                        "iso-8859-1").split()
+                except ValueError:
+                    writer.write(b"HTTP/1.1 400 Bad Request\r\n"
+                        b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+                    break
+
+                headers = {}
+                while True:
+                    ln = await reader.readline()
+                    if not ln.strip():
+                        break
+                    name, _, value = ln.decode("iso-8859-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if "content-length" in headers:
+                    await reader.readexactly(int(headers["content-length"]))
+
+                status, response_headers, body = self.respond(
+                    method, target, headers)
+                keep_alive = (version=="HTTP/1.1"
+                    and headers.get("connection", "").lower()!="close")
+
+                head = ["HTTP/1.1 {} {}".format(
+                    status, STATUS_PHRASES.get(status, "Unknown"))]
+                head.extend("{}: {}".format(*h) for h in response_headers)
+                head.append("Content-Length: {}".format(len(body)))
+                if not keep_alive:
+                    head.append("Connection: close")
+                writer.write(("\r\n".join(head)+"\r\n\r\n").encode(
+                    "iso-8859-1"))
+                if method!="HEAD" and status!=304:
+                    writer.write(body)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(server, host, port, started=None):
+    """runs server on host and port until cancelled.
+
+    If started is given, it is called with the port actually bound
+    once the server is listening (which is useful with port 0).
+    """
+    aio_server = await asyncio.start_server(
+        server.handle_connection, host, port)
+    if started:
+        started(aio_server.sockets[0].getsockname()[1])
+    async with aio_server:
+        await aio_server.serve_forever()
+
+
+############ self check
+
+def iter_negotiation_infos(root_dir):
+    """iterates over the contents of the negotiation.json files
+    below root_dir.
+    """
+    import json
+    for dirpath, dirnames, filenames in sorted(os.walk(root_dir)):
+        if "negotiation.json" in filenames:
+            with open(os.path.join(dirpath, "negotiation.json"),
+                    encoding="utf-8") as f:
+                yield json.load(f)
+
+
+def check_vocabulary(connection, prefix, neg):
+    """returns a list of problems with how the server at connection
+    (an http.client.HTTPConnection) negotiates the vocabulary described
+    by the negotiation.json content neg.
+    """
+    problems = []
+
+    def request(path, **headers):
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+        return response, response.read()
+
+    accepts = [(media_type, media_type) for media_type in neg["files"]]
+    accepts.append((None, neg["default"]))
+    for accept, media_type in accepts:
+        for suffix in ["", "/"]:
+            uri = prefix+neg["path"]+suffix
+            headers = {"Accept": accept} if accept else {}
+            response, _ = request(uri, **headers)
+            expected = prefix+neg["files"][media_type]
+            location = response.getheader("Location", "")
+            if response.status!=303 or not location.endswith(expected):
+                problems.append("{} for {}: {} {} rather than 303 to {}"
+                    .format(uri, accept, response.status, location, expected))
+
+    for path in neg["files"].values():
+        uri = prefix+path
+        response, body = request(uri)
+        etag = response.getheader("ETag")
+        if response.status!=200 or not etag:
+            problems.append("{}: {}, ETag {}".format(
+                uri, response.status, etag))
+            continue
+
+        response, _ = request(uri, **{"If-None-Match": etag})
+        if response.status!=304:
+            problems.append("{}: {} for matching If-None-Match".format(
+                uri, response.status))
+
+        media_type = response.getheader("Content-Type")
+        for encoding_name, _, _ in ENCODINGS:
+            response, compressed = request(uri,
+                **{"Accept-Encoding": encoding_name})
+            if response.getheader("Content-Encoding")!=encoding_name:
+                continue
+            if response.getheader("Content-Type")!=media_type:
+                problems.append("{}: {} variant declared as {} rather"
+                    " than {}".format(uri, encoding_name,
+                        response.getheader("Content-Type"), media_type))
+            if encoding_name=="gzip" and gzip.decompress(compressed)!=body:
+                problems.append("{}: gzip variant differs".format(uri))
+    return problems
+
+
+def self_check(root_dir, prefix):
+    """checks content negotiation for all vocabularies below root_dir
+    against their negotiation.json files and returns a list of problems.
+    """
+    import http.client
+
+    server = RDFServer(root_dir, prefix)
+    bound = threading.Event()
+    port = []
+
+    def run():
+        asyncio.run(serve(server, "127.0.0.1", 0,
+            lambda p: (port.append(p), bound.set())))
+
+    threading.Thread(target=run, daemon=True).start()
+    if not bound.wait(10):
+        raise ReportableError("Server did not start up")
+
+    connection = http.client.HTTPConnection("127.0.0.1", port[0])
+    problems, n_vocabs = [], 0
+    for neg in iter_negotiation_infos(root_dir):
+        problems.extend(check_vocabulary(connection, server.prefix, neg))
+        n_vocabs += 1
+    if not n_vocabs:
+        problems.append("No vocabularies found below {}".format(root_dir))
+    return problems
+
+
+def parse_command_line():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Serves a tree built by convert.py with content"
+        " negotiation as on the IVOA RDF repository.")
+    parser.add_argument("root_dir",
+        help="Root of the tree to serve (convert's --dest-dir).",
+        metavar="rdf-directory")
+    parser.add_argument("--host",
+        help="Address to listen on (default: %(default)s).",
+        default="127.0.0.1")
+    parser.add_argument("--port",
+        help="Port to listen on (default: %(default)s).",
+        type=int,
+        default=8080)
+    parser.add_argument("--prefix",
+        help="Path the tree is served under (default: %(default)s).",
+        default="/rdf/")
+    parser.add_argument("--redirect-ttl",
+        help="Let caches keep the redirects of content negotiation"
+        " for SECONDS seconds (default: %(default)s).",
+        dest="redirect_ttl",
+        type=int,
+        default=DEFAULT_REDIRECT_TTL,
+        metavar="SECONDS")
+    parser.add_argument("--self-check",
+        help="Instead of serving, check content negotiation for all"
+        " vocabularies in the tree and exit.",
+        dest="self_check",
+        action="store_true")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_command_line()
+    try:
+        if args.self_check:
+            problems = self_check(args.root_dir, args.prefix)
+            if problems:
+                die("Content negotiation problems:\n  {}\n".format(
+                    "\n  ".join(problems)))
+            print("Content negotiation ok.")
+            return
+
+        server = RDFServer(args.root_dir, args.prefix, args.redirect_ttl)
+        print("Serving {} on http://{}:{}{}".format(
+            args.root_dir, args.host, args.port, server.prefix))
+        asyncio.run(serve(server, args.host, args.port))
+
+    except ReportableError as msg:
+        die(str(msg)+"\n")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__=="__main__":
+    main()
+
+
+# vi:sw=4:et:sta